@@ -17,10 +17,11 @@ from phone_agent.utils.parallel_executor import (
     build_tasks_from_configs,
     load_devices_config,
     load_apps_config,
+    resume_session,
     run_parallel_tasks,
 )
 from phone_agent.utils.price_extractor import extract_price_from_message
-from mcp_mode.mcp_server.session_manager import get_session_manager, TaskState
+from mcp_mode.mcp_server.session_manager import get_session_manager
 
 # Track pre-checked devices across MCP server lifetime
 _prechecked_devices = set()
@@ -282,6 +283,101 @@ def load_model_config(
     return default_model_config
 
 
+def _build_compare_response(
+    results: List[Any],
+    product_name: Optional[str],
+    seller_name: Optional[str],
+    task_id: Optional[str],
+) -> Dict:
+    """Convert parallel results into the compare_prices response dict."""
+    takeover_interrupted = False
+    takeover_session_id = None
+    takeover_message = None
+    
+    platform_results = []
+    print(f"[MCP] 处理 {len(results)} 个结果...")
+    for result in results:
+        if result.stop_reason == "INFO_ACTION_NEEDS_REPLY":
+            takeover_interrupted = True
+            takeover_session_id = result.session_id
+            takeover_message = result.result
+            print(f"[MCP] 检测到接管中断: session_id={takeover_session_id}, message={takeover_message}")
+            # Still add the result to platform_results for information
+        platform_result = {
+            "app": result.app_name,
+            "device_id": result.device_id,
+            "duration": result.duration,
+            "raw_result": result.result,
+        }
+        
+        if result.success:
+            price_info = extract_price_from_message(result.result, app_name=result.app_name)
+            if price_info:
+                platform_result.update({
+                    "status": "success",
+                    "price": price_info.get("price"),
+                    "delivery_fee": price_info.get("delivery_fee", 0.0),
+                    "pack_fee": price_info.get("pack_fee", 0.0),
+                    "total_fee": price_info.get("total_fee"),
+                })
+            else:
+                platform_result.update({"status": "failed", "error": "无法提取价格信息"})
+        else:
+            platform_result.update({"status": "failed", "error": getattr(result, "error", "未知错误")})
+        
+        platform_results.append(platform_result)
+    
+    success_results = [r for r in platform_results if r["status"] == "success"]
+    
+    best_price = None
+    if success_results:
+        valid_results = [r for r in success_results if r.get("total_fee") is not None]
+        if valid_results:
+            best_result = min(valid_results, key=lambda x: x["total_fee"])
+            best_price = {
+                "app": best_result["app"],
+                "total_fee": best_result["total_fee"],
+            }
+    
+    max_duration = max((r["duration"] for r in platform_results), default=0.0)
+    
+    print(f"[MCP] 处理完成，takeover_interrupted={takeover_interrupted}, success_count={len(success_results)}")
+    
+    # If takeover interrupted, return immediately with session info
+    if takeover_interrupted:
+        return {
+            "product_name": product_name,
+            "seller_name": seller_name,
+            "task_id": task_id,
+            "session_id": takeover_session_id,
+            "stop_reason": "INFO_ACTION_NEEDS_REPLY",
+            "message": takeover_message,
+            "platforms": platform_results,  # Partial results if any
+            "summary": {
+                "total_platforms": len(platform_results),
+                "success_count": len(success_results),
+                "failed_count": len(platform_results) - len(success_results),
+                "interrupted": True,
+            },
+        }
+    
+    result_dict = {
+        "product_name": product_name,
+        "seller_name": seller_name,
+        "task_id": task_id,
+        "platforms": platform_results,
+        "summary": {
+            "total_platforms": len(platform_results),
+            "success_count": len(success_results),
+            "failed_count": len(platform_results) - len(success_results),
+            "best_price": best_price,
+            "total_duration": max_duration,
+        },
+    }
+    print(f"[MCP] 准备返回结果给客户端: {len(platform_results)} 个平台结果")
+    return result_dict
+
+
 def compare_prices_backend(
     product_name: str,
     seller_name: Optional[str] = None,
@@ -336,10 +432,6 @@ def compare_prices_backend(
         - stop_reason: "INFO_ACTION_NEEDS_REPLY"
         - message: Message from agent requesting intervention
     """
-    session_manager = get_session_manager()
-    continue_task = False
-    restored_state = None
-    
     if session_id:
         if not reply_from_client:
             return {
@@ -347,30 +439,41 @@ def compare_prices_backend(
                 "session_id": session_id,
             }
         
-        restored_state = session_manager.get(session_id)
+        restored_state = get_session_manager().get(session_id)
         if not restored_state:
             return {
                 "error": f"Session not found or expired: {session_id}",
                 "session_id": session_id,
             }
         
-        print(f"[MCP] 发送用户回复到等待中的进程: session_id={session_id}, reply={reply_from_client}")
+        if not product_name:
+            product_name = restored_state.keyword.split()[-1] if restored_state.keyword else "未知商品"
+            seller_name = restored_state.keyword.split()[0] if " " in restored_state.keyword else None
         
-        if session_manager.send_reply(session_id, reply_from_client):
-            print(f"[MCP] 已发送回复，worker 进程将继续执行...")
+        print(f"[MCP] 恢复会话: session_id={session_id}, reply={reply_from_client}")
+        try:
+            results = resume_session(
+                session_id,
+                reply_from_client,
+                model_base_url=model_base_url,
+                model_name=model_name,
+                model_api_key=model_api_key,
+                max_steps=max_steps,
+            )
+        except Exception as e:
+            print(f"[MCP错误] resume_session 执行失败: {e}")
+            import traceback
+            traceback.print_exc()
             return {
-                "product_name": restored_state.keyword.split()[-1] if restored_state.keyword else "未知商品",
-                "seller_name": restored_state.keyword.split()[0] if " " in restored_state.keyword else None,
-                "task_id": restored_state.task_id,
+                "error": f"任务执行失败: {str(e)}",
                 "session_id": session_id,
-                "status": "reply_sent",
-                "message": f"已发送回复，worker 进程将继续执行。任务完成后会返回最终结果。",
             }
-        else:
+        if results is None:
             return {
-                "error": f"无法发送回复到 session {session_id}（进程可能已结束）",
+                "error": f"Session not found or expired: {session_id}",
                 "session_id": session_id,
             }
+        return _build_compare_response(results, product_name, seller_name, restored_state.task_id)
     
     mcp_config = load_mcp_config(mcp_config_path)
     
@@ -417,47 +520,13 @@ def compare_prices_backend(
         print(f"[MCP] 设备映射: {app_to_device}")
         _precheck_devices(list(app_to_device.values()))
     
-    # Build tasks: if continuing, only create task for the interrupted app
-    if continue_task and restored_state:
-        # Create a single task for the interrupted app with continuation message
-        app_type_map = {"美团": "mt", "京东外卖": "jd", "淘宝闪购": "tb"}
-        app_type = app_type_map.get(restored_state.app_name, "unknown")
-        device_id = restored_state.device_id
-        
-        # Find app config
-        app_key = None
-        app_name_mapping = mcp_config["search"]["app_name_mapping"]
-        for name, key in app_name_mapping.items():
-            if name == restored_state.app_name:
-                app_key = key
-                break
-        
-        if not app_key or app_key not in apps_config:
-            return {
-                "error": f"App config not found for {restored_state.app_name}",
-                "session_id": session_id,
-            }
-        
-        app_info = apps_config[app_key]
-        # Modify task to include continuation message
-        continuation_task = f"用户已完成操作（{reply_from_client}），继续执行原任务：{restored_state.task}"
-        
-        from phone_agent.utils.parallel_executor import ParallelTask
-        tasks = [ParallelTask(
-            device_id=device_id,
-            task=continuation_task,
-            app_name=restored_state.app_name,
-            app_package=restored_state.app_package,
-        )]
-        print(f"[MCP] 继续任务: app={restored_state.app_name}, device={device_id}")
-    else:
-        tasks = build_tasks_from_configs(
-            apps_config=apps_config,
-            task_template=f"搜索{product_name}",
-            product_name=product_name,
-            seller_name=seller_name,
-            app_to_device_mapping=app_to_device if app_to_device else None,
-        )
+    tasks = build_tasks_from_configs(
+        apps_config=apps_config,
+        task_template=f"搜索{product_name}",
+        product_name=product_name,
+        seller_name=seller_name,
+        app_to_device_mapping=app_to_device if app_to_device else None,
+    )
     
     if not tasks:
         return {
@@ -466,35 +535,21 @@ def compare_prices_backend(
             "platforms": [],
             }
     
-    if continue_task and restored_state:
-        model_config = ModelConfig(**restored_state.model_config)
-        agent_config_dict = restored_state.agent_config.copy()
-        # Override with any provided parameters
-        if model_base_url:
-            model_config.base_url = model_base_url
-        if model_name:
-            model_config.model_name = model_name
-        if model_api_key:
-            model_config.api_key = model_api_key
-        agent_config = AgentConfig(**agent_config_dict)
-        if max_steps:
-            agent_config.max_steps = max_steps
-    else:
-        model_cfg = load_model_config(model_provider)
-        model_config = ModelConfig(
-            base_url=model_base_url or model_cfg["api_base"],
-            model_name=model_name or model_cfg["model_name"],
-            api_key=model_api_key or model_cfg["api_key"],
-            lang="zh",
-        )
-        agent_config = AgentConfig(
-            max_steps=max_steps,
-            device_id=None,
-            verbose=mcp_config["agent"]["verbose"],
-            lang=mcp_config["agent"]["lang"],
-            enable_screenshot_cache=mcp_config["agent"]["enable_screenshot_cache"],
-            screenshot_cache_max_age=mcp_config["agent"]["screenshot_cache_max_age"],
-        )
+    model_cfg = load_model_config(model_provider)
+    model_config = ModelConfig(
+        base_url=model_base_url or model_cfg["api_base"],
+        model_name=model_name or model_cfg["model_name"],
+        api_key=model_api_key or model_cfg["api_key"],
+        lang="zh",
+    )
+    agent_config = AgentConfig(
+        max_steps=max_steps,
+        device_id=None,
+        verbose=mcp_config["agent"]["verbose"],
+        lang=mcp_config["agent"]["lang"],
+        enable_screenshot_cache=mcp_config["agent"]["enable_screenshot_cache"],
+        screenshot_cache_max_age=mcp_config["agent"]["screenshot_cache_max_age"],
+    )
     
     # MCP mode: Always pass None for mongodb_connection_string to trigger sync mode
     print(f"[MCP] 开始执行 {len(tasks)} 个并行任务...")
@@ -522,90 +577,5 @@ def compare_prices_backend(
             "task_id": task_id,
             }
     
-    takeover_interrupted = False
-    takeover_session_id = None
-    takeover_message = None
-    
-    platform_results = []
-    print(f"[MCP] 处理 {len(results)} 个结果...")
-    for result in results:
-        if result.stop_reason == "INFO_ACTION_NEEDS_REPLY":
-            takeover_interrupted = True
-            takeover_session_id = result.session_id
-            takeover_message = result.result
-            print(f"[MCP] 检测到接管中断: session_id={takeover_session_id}, message={takeover_message}")
-            # Still add the result to platform_results for information
-        platform_result = {
-            "app": result.app_name,
-            "device_id": result.device_id,
-            "duration": result.duration,
-            "raw_result": result.result,
-        }
-        
-        if result.success:
-            price_info = extract_price_from_message(result.result, app_name=result.app_name)
-            if price_info:
-                platform_result.update({
-                    "status": "success",
-                    "price": price_info.get("price"),
-                    "delivery_fee": price_info.get("delivery_fee", 0.0),
-                    "pack_fee": price_info.get("pack_fee", 0.0),
-                    "total_fee": price_info.get("total_fee"),
-                })
-            else:
-                platform_result.update({"status": "failed", "error": "无法提取价格信息"})
-        else:
-            platform_result.update({"status": "failed", "error": getattr(result, "error", "未知错误")})
-        
-        platform_results.append(platform_result)
-    
-    success_results = [r for r in platform_results if r["status"] == "success"]
-    
-    best_price = None
-    if success_results:
-        valid_results = [r for r in success_results if r.get("total_fee") is not None]
-        if valid_results:
-            best_result = min(valid_results, key=lambda x: x["total_fee"])
-            best_price = {
-                "app": best_result["app"],
-                "total_fee": best_result["total_fee"],
-            }
-    
-    max_duration = max((r["duration"] for r in platform_results), default=0.0)
-    
-    print(f"[MCP] 处理完成，takeover_interrupted={takeover_interrupted}, success_count={len(success_results)}")
-    
-    # If takeover interrupted, return immediately with session info
-    if takeover_interrupted:
-        return {
-            "product_name": product_name,
-            "seller_name": seller_name,
-            "task_id": task_id,
-            "session_id": takeover_session_id,
-            "stop_reason": "INFO_ACTION_NEEDS_REPLY",
-            "message": takeover_message,
-            "platforms": platform_results,  # Partial results if any
-            "summary": {
-                "total_platforms": len(platform_results),
-                "success_count": len(success_results),
-                "failed_count": len(platform_results) - len(success_results),
-                "interrupted": True,
-            },
-        }
-    
-    result_dict = {
-        "product_name": product_name,
-        "seller_name": seller_name,
-        "task_id": task_id,
-        "platforms": platform_results,
-        "summary": {
-            "total_platforms": len(platform_results),
-            "success_count": len(success_results),
-            "failed_count": len(platform_results) - len(success_results),
-            "best_price": best_price,
-            "total_duration": max_duration,
-        },
-    }
-    print(f"[MCP] 准备返回结果给客户端: {len(platform_results)} 个平台结果")
-    return result_dict
+    return _build_compare_response(results, product_name, seller_name, task_id)
 
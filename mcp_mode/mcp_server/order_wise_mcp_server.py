@@ -1,8 +1,6 @@
 """Order Wise MCP Server - Price comparison tool for food delivery platforms."""
 
 import asyncio
-from fastmcp import FastMCP
-from starlette.responses import JSONResponse
 from typing import Annotated, Dict, List, Optional
 from pydantic import Field
 
@@ -13,18 +11,9 @@ from mcp_mode.mcp_server.order_wise_mcp_backend import compare_prices_backend, l
 # When client disconnects, the processes will continue running until completion
 
 
-mcp = FastMCP(
-    name="Order-Wise-MCP",
-    instructions="""
-    Order Wise MCP Server provides tools to compare prices across multiple food delivery platforms.
-    Use compare_prices to search for products and compare prices on Meituan, JD Waimai, and Taobao Shangou.
-    """
-)
-
-
-@mcp.custom_route(path="/", methods=["GET"])
 async def health_check(request):
     """Health check endpoint for root path."""
+    from starlette.responses import JSONResponse
     return JSONResponse({
         "status": "ok",
         "service": "Order-Wise-MCP",
@@ -32,9 +21,6 @@ async def health_check(request):
     })
 
 
-
-
-@mcp.tool
 async def compare_prices(
     product_name: Annotated[str, Field(description="Product name to search, e.g., '瑞幸咖啡'")],
     seller_name: Annotated[Optional[str], Field(description="Optional seller name, e.g., '瑞幸咖啡'")] = None,
@@ -126,6 +112,35 @@ async def compare_prices(
         raise
 
 
+def create_mcp_server():
+    """Build the FastMCP server and register its routes and tools.
+    
+    Not done at import time: run_parallel_tasks workers re-import the main
+    script (as __mp_main__), and they never serve MCP requests.
+    """
+    from fastmcp import FastMCP
+    
+    server = FastMCP(
+        name="Order-Wise-MCP",
+        instructions="""
+    Order Wise MCP Server provides tools to compare prices across multiple food delivery platforms.
+    Use compare_prices to search for products and compare prices on Meituan, JD Waimai, and Taobao Shangou.
+    """
+    )
+    server.custom_route(path="/", methods=["GET"])(health_check)
+    server.tool(compare_prices)
+    return server
+
+
+def __getattr__(name: str):
+    # `mcp` is built on first access, e.g. `from ...order_wise_mcp_server import mcp`
+    if name == "mcp":
+        global mcp
+        mcp = create_mcp_server()
+        return mcp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == "__main__":
     # Load configuration from server_config.yaml
     config = load_mcp_config()
@@ -138,5 +153,6 @@ if __name__ == "__main__":
     print(f"[MCP Server] 配置文件: mcp_mode/mcp_server/server_config.yaml")
     
     # Listen on configured host and port
+    mcp = create_mcp_server()
     mcp.run(transport="http", host=host, port=port)
 
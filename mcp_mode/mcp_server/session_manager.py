@@ -4,7 +4,6 @@ import threading
 import time
 from dataclasses import dataclass, asdict
 from typing import Any, Dict, Optional
-from queue import Queue, Empty
 
 
 @dataclass
@@ -20,6 +19,7 @@ class TaskState:
     user_id: str
     app_package: Optional[str] = None
     created_at: float = 0.0
+    resumable_state: Optional[Dict[str, Any]] = None  # Agent checkpoint at takeover (e.g. step_count)
     
     def __post_init__(self):
         if self.created_at == 0.0:
@@ -37,7 +37,6 @@ class SessionManager:
             ttl_seconds: Time-to-live for sessions in seconds (default: 1 hour)
         """
         self._sessions: Dict[str, TaskState] = {}
-        self._reply_queues: Dict[str, Queue] = {}  # session_id -> Queue for user reply
         self._lock = threading.Lock()
         self._ttl = ttl_seconds
     
@@ -45,9 +44,6 @@ class SessionManager:
         """Save task state for session recovery."""
         with self._lock:
             self._sessions[session_id] = state
-            # Create reply queue if not exists
-            if session_id not in self._reply_queues:
-                self._reply_queues[session_id] = Queue()
     
     def get(self, session_id: str) -> Optional[TaskState]:
         """Get task state by session_id. Returns None if not found or expired."""
@@ -59,44 +55,14 @@ class SessionManager:
             # Check TTL
             if time.time() - state.created_at > self._ttl:
                 del self._sessions[session_id]
-                if session_id in self._reply_queues:
-                    del self._reply_queues[session_id]
                 return None
             
             return state
     
-    def wait_for_reply(self, session_id: str, timeout: Optional[float] = None) -> Optional[str]:
-        """Wait for user reply. Returns reply string or None if timeout."""
-        with self._lock:
-            queue = self._reply_queues.get(session_id)
-            if queue is None:
-                return None
-        
-        try:
-            return queue.get(timeout=timeout)
-        except Empty:
-            return None
-    
-    def send_reply(self, session_id: str, reply: str) -> bool:
-        """Send user reply to waiting process. Returns True if sent, False if queue not found."""
-        with self._lock:
-            queue = self._reply_queues.get(session_id)
-            if queue is None:
-                return False
-        
-        queue.put(reply)
-        return True
-    
     def delete(self, session_id: str) -> bool:
         """Delete session. Returns True if deleted, False if not found."""
         with self._lock:
-            deleted = False
-            if session_id in self._sessions:
-                del self._sessions[session_id]
-                deleted = True
-            if session_id in self._reply_queues:
-                del self._reply_queues[session_id]
-            return deleted
+            return self._sessions.pop(session_id, None) is not None
     
     def cleanup_expired(self) -> int:
         """Clean up expired sessions. Returns number of sessions cleaned."""
@@ -108,8 +74,6 @@ class SessionManager:
             ]
             for sid in expired:
                 del self._sessions[sid]
-                if sid in self._reply_queues:
-                    del self._reply_queues[sid]
             return len(expired)
     
     def count(self) -> int:
@@ -8,7 +8,7 @@ from phone_agent.utils.parallel_executor import (
     load_devices_config,
     run_parallel_tasks,
 )
-from phone_agent.utils.screenshot_cache import ScreenshotCache
+from phone_agent.utils.screenshot_cache import ScreenshotCache, make_screenshot_cache
 from phone_agent.utils.mongodb_writer import MongoDBWriter
 from phone_agent.utils.mongodb_listener import MongoDBListener
 from phone_agent.utils.device_manager import DeviceManager
@@ -22,6 +22,7 @@ from phone_agent.utils.price_extractor import (
 
 __all__ = [
     "ScreenshotCache",
+    "make_screenshot_cache",
     "ParallelTask",
     "ParallelResult",
     "run_parallel_tasks",
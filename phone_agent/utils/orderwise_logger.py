@@ -15,6 +15,14 @@ def set_quiet(enabled: bool):
     global _quiet
     _quiet = enabled
 
+def get_log_mode() -> tuple[bool, bool]:
+    """获取 (verbose, quiet)，用于在子进程中恢复日志模式"""
+    return _verbose, _quiet
+
+def is_debug_enabled() -> bool:
+    """是否输出调试信息（用于跳过昂贵的调试消息构造）"""
+    return _verbose and not _quiet
+
 def debug(msg: str, flush: bool = False):
     """调试信息（仅在 verbose 模式显示）"""
     if _verbose and not _quiet:
@@ -1,24 +1,39 @@
 """Parallel execution on multiple devices."""
 
+import copy
 import hashlib
 import json
+import multiprocessing
 import os
 import re
+import secrets
+import string
 import subprocess
 import threading
 import time
-import uuid
 from concurrent.futures import ThreadPoolExecutor
-from dataclasses import dataclass
-from multiprocessing import Process, Queue
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from multiprocessing import Queue
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from queue import Empty
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
 
 from phone_agent import PhoneAgent
 from phone_agent.adb.screenshot import get_screenshot
 from phone_agent.agent import AgentConfig
 from phone_agent.model import ModelConfig
-from phone_agent.utils.orderwise_logger import debug, info, warning, error
+from phone_agent.utils.orderwise_logger import (
+    debug,
+    error,
+    get_log_mode,
+    info,
+    is_debug_enabled,
+    set_quiet,
+    set_verbose,
+    warning,
+)
 
 # App name to app type mapping
 _APP_TYPE_MAP = {
@@ -28,6 +43,34 @@ _APP_TYPE_MAP = {
 }
 
 
+_mp_context = None
+_mp_context_lock = threading.Lock()
+
+
+def _get_mp_context():
+    """Multiprocessing context for task workers, created on first use.
+    
+    Workers fork from a forkserver that has preloaded the agent modules,
+    instead of copying the caller's whole process (fork). Each worker still
+    re-imports the caller's main script as __mp_main__, so scripts calling
+    run_parallel_tasks should keep heavy setup behind ``__name__ == "__main__"``.
+    
+    Note: the forkserver and its preload list are process-wide. The list is
+    set on the first run_parallel_tasks call (not at import) and replaces
+    any list set earlier in the process.
+    """
+    global _mp_context
+    with _mp_context_lock:
+        if _mp_context is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["phone_agent.utils.parallel_executor"])
+            else:
+                context = multiprocessing.get_context()
+            _mp_context = context
+        return _mp_context
+
+
 def _format_app_prefix(app_name: Optional[str]) -> str:
     """Format app name prefix for logging."""
     return f"[{app_name}] " if app_name else ""
@@ -39,11 +82,6 @@ def _get_session_manager():
     return get_session_manager()
 
 
-def _delete_session(session_id: str) -> None:
-    """Delete session (lazy import to avoid circular dependency)."""
-    _get_session_manager().delete(session_id)
-
-
 class TakeoverInterrupt(Exception):
     """Exception raised when takeover is triggered in sync mode (MCP mode)."""
     def __init__(self, task_id: str, app_type: str, user_id: Union[str, int], message: str):
@@ -61,6 +99,8 @@ class ParallelTask:
     task: str
     app_name: Optional[str] = None
     app_package: Optional[str] = None
+    app_type: Optional[str] = None  # jd/tb/mt; resolved from app_name if not set
+    launch_app: bool = True  # False when resuming a takeover, to keep the current screen
 
 
 @dataclass
@@ -75,6 +115,60 @@ class ParallelResult:
     error: Optional[str] = None
     session_id: Optional[str] = None  # Session ID for continuing interrupted tasks (MCP sync mode)
     stop_reason: Optional[str] = None  # Stop reason: "INFO_ACTION_NEEDS_REPLY" for takeover
+    resumable_state: Optional[Dict[str, Any]] = None  # Agent checkpoint at takeover (MCP sync mode)
+
+
+_RESULT_FIELDS = tuple(f.name for f in fields(ParallelResult))
+
+
+def _put_result(result_queue: Queue, result: ParallelResult) -> None:
+    """Put result on the queue as a plain field tuple (cheaper to pickle than the dataclass)."""
+    result_queue.put(tuple(getattr(result, name) for name in _RESULT_FIELDS))
+
+
+def _save_takeover_session(
+    result: ParallelResult,
+    tasks: List[ParallelTask],
+    model_config: ModelConfig,
+    agent_config: AgentConfig,
+    task_id: Optional[str],
+    user_id: Optional[Union[str, int]],
+    keyword: Optional[str],
+) -> None:
+    """Save task state for a takeover result so resume_session() can continue it."""
+    from mcp_mode.mcp_server.session_manager import TaskState
+    
+    app_package = next(
+        (t.app_package for t in tasks if t.device_id == result.device_id and t.task == result.task),
+        None,
+    )
+    state = TaskState(
+        device_id=result.device_id,
+        app_name=result.app_name or "unknown",
+        task=result.task,
+        model_config={
+            "base_url": model_config.base_url,
+            "model_name": model_config.model_name,
+            "api_key": model_config.api_key,
+            "lang": model_config.lang,
+        },
+        agent_config={
+            "max_steps": agent_config.max_steps,
+            "device_id": result.device_id,
+            "verbose": agent_config.verbose,
+            "lang": agent_config.lang,
+            "enable_screenshot_cache": agent_config.enable_screenshot_cache,
+            "screenshot_cache_max_age": agent_config.screenshot_cache_max_age,
+            "app_name": result.app_name,
+        },
+        keyword=keyword or result.task,
+        task_id=task_id or "unknown",
+        user_id=str(user_id) if user_id else "unknown",
+        app_package=app_package,
+        resumable_state=result.resumable_state,
+    )
+    _get_session_manager().save(result.session_id, state)
+    debug(f"[Takeover同步模式] {result.app_name}: 已保存任务状态，session_id={result.session_id}")
 
 
 def _create_takeover_callbacks(
@@ -104,7 +198,7 @@ def _create_takeover_callbacks(
     """
     if sync_mode:
         if not session_id:
-            session_id = f"{task_id}_{app_type}_{user_id}_{uuid.uuid4().hex[:8]}"
+            session_id = f"{task_id}_{app_type}_{user_id}_{secrets.token_hex(4)}"
         
         def takeover_callback(message: str) -> None:
             """Sync mode takeover callback: raise exception to notify worker process."""
@@ -143,6 +237,30 @@ def _create_takeover_callbacks(
     return takeover_callback, takeover_check_callback
 
 
+_APP_LAUNCH_POLL_INTERVAL = 0.15
+
+
+def _wait_for_app_focus(adb_cmd: List[str], app_package: str, timeout: float) -> bool:
+    """Poll window focus until app_package is in the foreground or timeout expires."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            output = subprocess.run(
+                adb_cmd + ["shell", "dumpsys window | grep -E 'mCurrentFocus|mFocusedApp'"],
+                capture_output=True,
+                text=True,
+                timeout=max(deadline - time.monotonic(), 0.1),
+            ).stdout
+        except subprocess.TimeoutExpired:
+            output = ""
+        if app_package in output:
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(_APP_LAUNCH_POLL_INTERVAL, remaining))
+
+
 def _launch_app(device_id: str, app_package: str) -> None:
     """Launch app on device."""
     adb_cmd = ["adb"]
@@ -150,6 +268,7 @@ def _launch_app(device_id: str, app_package: str) -> None:
         adb_cmd.extend(["-s", device_id])
     
     if app_package == "com.taobao.shangou":
+        # Opens in the browser, so there is no package focus to poll for
         subprocess.run(
             adb_cmd + ["shell", "am", "start", "-a", "android.intent.action.VIEW", "-d", "https://m.tb.cn/h.7R6B3Yc"],
             stdout=subprocess.DEVNULL,
@@ -162,7 +281,26 @@ def _launch_app(device_id: str, app_package: str) -> None:
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
         )
-        time.sleep(3.8 if "jd" in app_package.lower() or "jingdong" in app_package.lower() else 2.3)
+        # Previous fixed delays are kept as the upper bound
+        timeout = 3.8 if "jd" in app_package.lower() or "jingdong" in app_package.lower() else 2.3
+        _wait_for_app_focus(adb_cmd, app_package, timeout)
+
+
+_PRODUCT_RES = (
+    re.compile(r"商品[：:]\s*([^\n，,。¥]+)"),
+    re.compile(r"商品名称[：:]\s*([^\n，,。¥]+)"),
+)
+_PRODUCT_CLEAN_RE = re.compile(r'^[^的]*的\s*(?:-\s*)?|¥\d+(?:\.\d+)?|\s*[×xX]\s*\d+|^\s*-\s*|\s*-\s*$')
+_SELLER_RES = (
+    re.compile(r"(?:商家|店铺)[：:]\s*([^，,。\n]+?)(?=[，,。\n]|$)"),
+    re.compile(r"([^，,。\n]+?\([^)]+店\))(?:[：:]|$)"),
+)
+_SELLER_PREFIX_RE = re.compile(r'^(我可以看到|店铺名称|找到|店铺|商家名称|[-*]\s*)\s*', re.IGNORECASE)
+_INVALID_SELLER_RE = re.compile("|".join(map(re.escape, [
+    "任务已完成", "已经成功", "为您下单", "订单详情", "用户搜索时候的品牌名", "未知商家", "XXX", "xxx", "Xxx",
+])))
+# 价格提取失败时用于调试输出的关键词
+_PRICE_KEYWORDS = ("订单总价", "总价", "合计", "应付总额", "总计", "运费", "打包费")
 
 
 # Global thread pool executor for async MongoDB writes
@@ -177,6 +315,7 @@ def _write_result_to_mongodb(
     user_id: Optional[Union[str, int]],
     mongodb_connection_string: str,
     device_id: Optional[str] = None,
+    app_type: str = "unknown",
 ) -> None:
     """Write task result to MongoDB asynchronously (non-blocking)."""
     def _write_with_error_handling():
@@ -193,7 +332,7 @@ def _write_result_to_mongodb(
             final_task_id = task_id
             if not final_task_id:
                 timestamp = int(time.time() * 1000)
-                final_task_id = f"task_{timestamp}_{hashlib.md5(keyword.encode()).hexdigest()[:8]}"
+                final_task_id = f"task_{timestamp}_{hashlib.blake2b(keyword.encode(), digest_size=4).hexdigest()}"
                 debug(f"[MongoDB] 未找到taskId，使用默认值: {final_task_id}")
             
             final_user_id = user_id
@@ -203,48 +342,30 @@ def _write_result_to_mongodb(
             
             price_info = extract_price_from_message(result, app_name)
             minimum_price = detect_minimum_price(result)
-            app_type = _APP_TYPE_MAP.get(app_name, "unknown")
             
-            if not price_info and result:
-                price_keywords = ["订单总价", "总价", "合计", "应付总额", "总计", "运费", "打包费"]
-                found_keywords = [kw for kw in price_keywords if kw in result]
+            if not price_info and result and is_debug_enabled():
+                found_keywords = [kw for kw in _PRICE_KEYWORDS if kw in result]
                 debug(f"[MongoDB] 价格提取失败: message长度={len(result)}, 前200字符={result[:200]}, 关键词={found_keywords}")
             
             if price_info:
                 product = keyword or "未知商品"
-                product_patterns = [
-                    r"商品[：:]\s*([^\n，,。¥]+)",
-                    r"商品名称[：:]\s*([^\n，,。¥]+)",
-                ]
-                for pattern in product_patterns:
-                    match = re.search(pattern, result)
+                for pattern in _PRODUCT_RES:
+                    match = pattern.search(result)
                     if match:
-                        extracted_product = match.group(1).strip()
-                        if "的" in extracted_product:
-                            product_parts = extracted_product.split("的", 1)
-                            if len(product_parts) > 1:
-                                extracted_product = product_parts[1].strip()
-                        # Clean product name: remove price, quantity, and dashes
-                        extracted_product = re.sub(r'¥\d+(?:\.\d+)?|\s*[×xX]\s*\d+|^\s*-\s*|\s*-\s*$', '', extracted_product).strip()
+                        # Keep the part after the first "的", drop price, quantity, and dashes
+                        extracted_product = _PRODUCT_CLEAN_RE.sub('', match.group(1).strip()).strip()
                         if extracted_product:
                             product = extracted_product
                             break
                 
                 seller = None
-                seller_patterns = [
-                    r"(?:商家|店铺)[：:]\s*([^，,。\n]+?)(?=[，,。\n]|$)",
-                    r"([^，,。\n]+?\([^)]+店\))(?:[：:]|$)",
-                ]
-                invalid_phrases = ["任务已完成", "已经成功", "为您下单", "订单详情", "用户搜索时候的品牌名", "未知商家", "XXX", "xxx", "Xxx"]
-                
-                for pattern in seller_patterns:
-                    seller_match = re.search(pattern, result)
+                for pattern in _SELLER_RES:
+                    seller_match = pattern.search(result)
                     if seller_match:
-                        candidate = seller_match.group(1).strip()
-                        candidate = re.sub(r'^(我可以看到|店铺名称|找到|店铺|商家名称|[-*]\s*)\s*', '', candidate, flags=re.IGNORECASE).strip()
+                        candidate = _SELLER_PREFIX_RE.sub('', seller_match.group(1).strip()).strip()
                         if (candidate and len(candidate) >= 2 and len(candidate) <= 50 and 
-                            not any(phrase in candidate for phrase in invalid_phrases) and
-                            candidate not in ["XXX", "xxx", "Xxx", "未知", "未知商家"]):
+                            not _INVALID_SELLER_RE.search(candidate) and
+                            candidate != "未知"):
                             seller = candidate
                             break
                 
@@ -282,6 +403,55 @@ def _write_result_to_mongodb(
     _mongodb_executor.submit(_write_with_error_handling)
 
 
+# Opt-in CPU pinning of task workers (ORDERWISE_PIN_WORKERS=1)
+_PIN_WORKERS = os.getenv("ORDERWISE_PIN_WORKERS", "0") == "1" and hasattr(os, "sched_setaffinity")
+_cpu_slot_lock = threading.Lock()
+_next_cpu_slot = 0
+_adb_server_lock = threading.Lock()
+_adb_server_started = False
+
+
+def _allocate_cpu_slot() -> int:
+    """Next core slot, shared by all concurrent run_parallel_tasks calls in this process."""
+    global _next_cpu_slot
+    with _cpu_slot_lock:
+        slot = _next_cpu_slot
+        _next_cpu_slot = (slot + 1) % len(os.sched_getaffinity(0))
+        return slot
+
+
+def _ensure_adb_server() -> None:
+    """Start the adb server from this (unpinned) process, once.
+    
+    CPU affinity is inherited across fork/exec, so an adb server started
+    by a pinned worker would be stuck on that worker's core.
+    """
+    global _adb_server_started
+    with _adb_server_lock:
+        if _adb_server_started:
+            return
+        try:
+            subprocess.run(
+                ["adb", "start-server"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=10,
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            debug(f"[Worker] adb start-server 失败: {e}")
+        _adb_server_started = True
+
+
+def _pin_worker_to_cpu(cpu_slot: int) -> None:
+    """Pin the current worker process to the allowed CPU core at cpu_slot."""
+    try:
+        cpus = sorted(os.sched_getaffinity(0))
+        if len(cpus) > 1:
+            os.sched_setaffinity(0, {cpus[cpu_slot % len(cpus)]})
+    except OSError as e:
+        debug(f"[Worker] CPU 绑定失败: {e}")
+
+
 def _run_single_task_worker(
     device_id: str,
     task: str,
@@ -301,17 +471,38 @@ def _run_single_task_worker(
     user_id: Optional[Union[str, int]] = None,
     keyword: Optional[str] = None,
     mongodb_connection_string: Optional[str] = None,
-    device_manager: Optional[Any] = None,
+    managed_device: bool = False,
+    pre_connected: bool = False,
+    app_type: str = "unknown",
+    log_mode: Tuple[bool, bool] = (False, False),
+    cpu_slot: Optional[int] = None,
+    launch_app: bool = True,
 ) -> None:
-    """Worker function to run a single task on a device."""
+    """Worker function to run a single task on a device.
+    
+    managed_device: the device belongs to the parent's DeviceManager; it is
+        always disconnected when the task ends.
+    pre_connected: the parent has already connected the device, so the
+        worker skips its own connect step.
+    log_mode: (verbose, quiet) from the parent, since forkserver workers do
+        not inherit runtime logger settings.
+    cpu_slot: Core slot to pin this worker to, or None to leave it unpinned.
+    launch_app: Launch app_package before running; app_package is still
+        recorded for takeover sessions when this is False.
+    """
     from phone_agent.adb import ADBConnection
     start_time = time.time()
+    set_verbose(log_mode[0])
+    set_quiet(log_mode[1])
+    if cpu_slot is not None:
+        _pin_worker_to_cpu(cpu_slot)
 
     device_connected_by_worker = False
     conn = None
+    launch_thread = None
 
     def _put_connection_error(msg: str):
-        result_queue.put(ParallelResult(
+        _put_result(result_queue, ParallelResult(
             device_id=device_id,
             task=task,
             app_name=app_name,
@@ -322,21 +513,10 @@ def _run_single_task_worker(
         ))
 
     try:
-        if device_manager:
-            device_info = device_manager.conn.get_device_info(device_id)
-            if device_info and device_info.status == "unauthorized":
-                warning(f"{_format_app_prefix(app_name)}[设备] 设备未授权，重新连接: {device_id}")
-                device_manager.conn.disconnect(device_id)
-                time.sleep(1)
-
-            results = device_manager.connect_devices(device_ids=[device_id])
-            if not results.get(device_id):
-                error(f"{_format_app_prefix(app_name)}[设备] 连接失败: {device_id}")
-                _put_connection_error(device_id)
-                return
+        conn = ADBConnection()
+        if managed_device:
             device_connected_by_worker = True
-        else:
-            conn = ADBConnection()
+        if not pre_connected:
             device_info = conn.get_device_info(device_id)
 
             if device_info and device_info.status == "unauthorized":
@@ -352,8 +532,12 @@ def _run_single_task_worker(
                     return
                 device_connected_by_worker = True
 
-        if app_package:
-            _launch_app(device_id, app_package)
+        if app_package and launch_app:
+            # Launch in background so the app's startup wait overlaps with agent setup
+            launch_thread = threading.Thread(
+                target=_launch_app, args=(device_id, app_package), daemon=True
+            )
+            launch_thread.start()
     except Exception as e:
         error(f"{_format_app_prefix(app_name)}[设备连接错误] {str(e)}")
         _put_connection_error(str(e))
@@ -383,7 +567,6 @@ def _run_single_task_worker(
     takeover_check_callback = None
     session_id_for_takeover = None
     stop_reason = None
-    app_type = _APP_TYPE_MAP.get(app_name, "unknown")
     
     required_params = {"keyword": keyword, "task_id": task_id, "user_id": user_id}
     if not sync_mode:
@@ -396,37 +579,8 @@ def _run_single_task_worker(
         warning(f"[警告] {app_name}: {mode_name} takeover功能不可用，缺少参数: {', '.join(missing_params)}")
     
     if sync_mode and not missing_params:
-        session_id_for_takeover = f"{task_id}_{app_type}_{user_id}_{uuid.uuid4().hex[:8]}"
-        
-        from mcp_mode.mcp_server.session_manager import get_session_manager, TaskState
-        
-        session_manager = get_session_manager()
-        state = TaskState(
-            device_id=device_id,
-            app_name=app_name or "unknown",
-            task=task,
-            model_config={
-                "base_url": model_base_url,
-                "model_name": model_name,
-                "api_key": model_api_key,
-                "lang": model_lang,
-            },
-            agent_config={
-                "max_steps": max_steps,
-                "device_id": device_id,
-                "verbose": verbose,
-                "lang": lang,
-                "enable_screenshot_cache": enable_screenshot_cache,
-                "screenshot_cache_max_age": screenshot_cache_max_age,
-                "app_name": app_name,
-            },
-            keyword=keyword or task,
-            task_id=task_id or "unknown",
-            user_id=str(user_id) if user_id else "unknown",
-            app_package=app_package,
-        )
-        session_manager.save(session_id_for_takeover, state)
-        debug(f"[Takeover同步模式] {app_name}: 已保存任务状态，session_id={session_id_for_takeover}")
+        # Task state is saved by the parent when the takeover result arrives
+        session_id_for_takeover = f"{task_id}_{app_type}_{user_id}_{secrets.token_hex(4)}"
         
         takeover_callback, takeover_check_callback = _create_takeover_callbacks(
             mongodb_writer=None,
@@ -463,20 +617,25 @@ def _run_single_task_worker(
         takeover_callback=takeover_callback,
     )
     
+    if launch_thread:
+        launch_thread.join()
+    
     try:
         result = agent.run(task)
         duration = time.time() - start_time
         
-        debug(f"{_format_app_prefix(app_name)}[任务完成] agent.run() 返回: {result[:100] if result else 'None'}")
+        debug_enabled = is_debug_enabled()
+        if debug_enabled:
+            debug(f"{_format_app_prefix(app_name)}[任务完成] agent.run() 返回: {result[:100] if result else 'None'}")
         
         if mongodb_connection_string and keyword:
             _write_result_to_mongodb(
-                result, app_name, keyword, task_id, user_id, mongodb_connection_string, device_id
+                result, app_name, keyword, task_id, user_id, mongodb_connection_string, device_id, app_type
             )
         
-        app_prefix = _format_app_prefix(app_name)
-        debug(f"{app_prefix}[任务完成] 准备放入结果队列...")
-        result_queue.put(ParallelResult(
+        if debug_enabled:
+            debug(f"{_format_app_prefix(app_name)}[任务完成] 准备放入结果队列...")
+        _put_result(result_queue, ParallelResult(
             device_id=device_id,
             task=task,
             app_name=app_name,
@@ -484,18 +643,16 @@ def _run_single_task_worker(
             duration=duration,
             success=True,
         ))
-        debug(f"{app_prefix}[任务完成] 已放入结果队列")
-        
-        # Clean up session if task completed successfully
-        if session_id_for_takeover:
-            _delete_session(session_id_for_takeover)
+        if debug_enabled:
+            debug(f"{_format_app_prefix(app_name)}[任务完成] 已放入结果队列")
     except TakeoverInterrupt as e:
         duration = time.time() - start_time
-        session_id = session_id_for_takeover
         
-        info(f"[Takeover同步模式] {app_name}: 捕获到TakeoverInterrupt，会话ID={session_id}")
+        # Exit instead of blocking on the user's reply; resume_session() continues
+        # the task in a fresh worker once the reply arrives
+        info(f"[Takeover同步模式] {app_name}: 捕获到TakeoverInterrupt，会话ID={session_id_for_takeover}，等待用户回复后恢复")
         
-        result_queue.put(ParallelResult(
+        _put_result(result_queue, ParallelResult(
             device_id=device_id,
             task=task,
             app_name=app_name,
@@ -503,55 +660,16 @@ def _run_single_task_worker(
             duration=duration,
             success=False,
             error="Takeover required",
-            session_id=session_id,
+            session_id=session_id_for_takeover,
             stop_reason="INFO_ACTION_NEEDS_REPLY",
+            resumable_state={"step_count": agent.step_count},
         ))
-        
-        session_manager = _get_session_manager()
-        
-        info(f"[Takeover同步模式] {app_name}: 等待用户输入（session_id={session_id}）...")
-        reply = session_manager.wait_for_reply(session_id, timeout=None)
-        
-        if not reply:
-            warning(f"[Takeover同步模式] {app_name}: 未收到用户输入，任务终止")
-            result_queue.put(ParallelResult(
-                device_id=device_id,
-                task=task,
-                app_name=app_name,
-                result=None,
-                duration=time.time() - start_time,
-                success=False,
-                error="Takeover timeout: no user reply",
-            ))
-            return
-        
-        info(f"[Takeover同步模式] {app_name}: 收到用户输入: {reply}，继续执行任务")
-        modified_task = f"用户已完成操作（{reply}），继续执行原任务：{task}"
-        
-        result = agent.run(modified_task)
-        duration = time.time() - start_time
-        
-        if mongodb_connection_string and keyword:
-            _write_result_to_mongodb(
-                result, app_name, keyword, task_id, user_id, mongodb_connection_string, device_id
-            )
-        
-        result_queue.put(ParallelResult(
-            device_id=device_id,
-            task=task,
-            app_name=app_name,
-            result=result,
-            duration=duration,
-            success=True,
-        ))
-        
-        session_manager.delete(session_id)
     except Exception as e:
         duration = time.time() - start_time
         error_msg = str(e)
         error(f"{_format_app_prefix(app_name)}[错误] 任务执行失败: {error_msg}")
         
-        result_queue.put(ParallelResult(
+        _put_result(result_queue, ParallelResult(
             device_id=device_id,
             task=task,
             app_name=app_name,
@@ -560,15 +678,32 @@ def _run_single_task_worker(
             success=False,
             error=error_msg,
         ))
-        
-        if session_id_for_takeover:
-            _delete_session(session_id_for_takeover)
     finally:
-        if device_connected_by_worker:
-            if device_manager:
-                device_manager.conn.disconnect(device_id)
-            elif conn:
-                conn.disconnect(device_id)
+        if device_connected_by_worker and conn:
+            conn.disconnect(device_id)
+
+
+# (processes, result_queue) of runs that returned early on takeover. The queue's
+# semaphores are unlinked once it is garbage collected, and forkserver workers
+# only open them by name while starting up, so the queue must outlive its workers.
+_detached_runs: List[Tuple[List[Any], Any]] = []
+_detached_runs_lock = threading.Lock()
+
+
+def _retain_detached_run(processes: List[Any], result_queue: Any) -> None:
+    """Keep a run's queue alive until its workers exit; drops runs that have finished."""
+    with _detached_runs_lock:
+        _detached_runs[:] = [run for run in _detached_runs if any(p.is_alive() for p in run[0])]
+        _detached_runs.append((processes, result_queue))
+
+
+def _preconnect_device(device_manager: Any, device_id: str) -> bool:
+    """Connect a device through the DeviceManager; on failure the worker connects it itself."""
+    try:
+        return bool(device_manager.connect_devices(device_ids=[device_id]).get(device_id))
+    except Exception as e:
+        warning(f"[设备] 预连接失败，由 worker 自行连接: {device_id}, {e}")
+        return False
 
 
 def run_parallel_tasks(
@@ -604,12 +739,28 @@ def run_parallel_tasks(
                     device_manager.release_device(device_id)
                 return []
     
-    result_queue = Queue()
+    pre_connected_devices = set()
     processes = []
     
     try:
+        mp_context = _get_mp_context()
+        result_queue = mp_context.Queue()
+        if device_locks_acquired:
+            # Connect all devices concurrently before spawning workers
+            with ThreadPoolExecutor(max_workers=len(device_locks_acquired)) as pool:
+                connected = pool.map(
+                    lambda d: _preconnect_device(device_manager, d),
+                    device_locks_acquired,
+                )
+                pre_connected_devices = {
+                    device_id for device_id, ok in zip(device_locks_acquired, connected) if ok
+                }
+        
+        if _PIN_WORKERS:
+            _ensure_adb_server()
+        
         for task in tasks:
-            p = Process(
+            p = mp_context.Process(
                 target=_run_single_task_worker,
                 args=(
                     task.device_id,
@@ -630,7 +781,12 @@ def run_parallel_tasks(
                     user_id,
                     keyword,
                     mongodb_connection_string,
-                    device_manager,
+                    device_manager is not None,
+                    task.device_id in pre_connected_devices,
+                    task.app_type or _APP_TYPE_MAP.get(task.app_name, "unknown"),
+                    get_log_mode(),
+                    _allocate_cpu_slot() if _PIN_WORKERS else None,
+                    task.launch_app,
                 ),
             )
             processes.append(p)
@@ -641,27 +797,34 @@ def run_parallel_tasks(
         
         info(f"[MCP] 等待 {len(tasks)} 个任务完成...")
         start_wait_time = time.time()
+        debug_enabled = is_debug_enabled()
         while len(results) < len(tasks):
-            elapsed = time.time() - start_wait_time
-            debug(f"[MCP] 等待结果... (已收到 {len(results)}/{len(tasks)}, 已等待 {elapsed:.1f}秒)")
-            result = result_queue.get()
-            debug(f"[MCP] 收到结果: {result.app_name}, success={result.success}, error={result.error if hasattr(result, 'error') else 'None'}")
+            if debug_enabled:
+                elapsed = time.time() - start_wait_time
+                debug(f"[MCP] 等待结果... (已收到 {len(results)}/{len(tasks)}, 已等待 {elapsed:.1f}秒)")
+            result = ParallelResult(*result_queue.get())
+            if debug_enabled:
+                debug(f"[MCP] 收到结果: {result.app_name}, success={result.success}, error={result.error if hasattr(result, 'error') else 'None'}")
             results.append(result)
             
             if result.stop_reason == "INFO_ACTION_NEEDS_REPLY":
                 info(f"[MCP] 检测到 takeover（{result.app_name}），立即返回结果（不等待其他进程完成）")
+                _save_takeover_session(result, tasks, model_config, agent_config, task_id, user_id, keyword)
                 while len(results) < len(tasks):
                     try:
-                        result = result_queue.get(timeout=0.1)
-                        results.append(result)
-                        debug(f"[MCP] 收到额外结果: {result.app_name}")
-                    except:
+                        result = ParallelResult(*result_queue.get_nowait())
+                    except Empty:
                         break
+                    results.append(result)
+                    if debug_enabled:
+                        debug(f"[MCP] 收到额外结果: {result.app_name}")
                 break
         
         # Only wait for processes if no takeover was detected
         takeover_detected = any(r.stop_reason == "INFO_ACTION_NEEDS_REPLY" for r in results)
-        if not takeover_detected:
+        if takeover_detected:
+            _retain_detached_run(processes, result_queue)
+        else:
             for p in processes:
                 p.join()
         success_results = [r for r in results if r.success]
@@ -686,38 +849,170 @@ def run_parallel_tasks(
                 device_manager.release_device(device_id)
 
 
+def resume_session(
+    session_id: str,
+    reply: str,
+    device_manager: Optional[Any] = None,
+    model_base_url: Optional[str] = None,
+    model_name: Optional[str] = None,
+    model_api_key: Optional[str] = None,
+    max_steps: Optional[int] = None,
+) -> Optional[List[ParallelResult]]:
+    """Continue a task interrupted by takeover in a fresh worker.
+    
+    Rebuilds the model and agent configs from the TaskState saved when the
+    takeover was raised, then runs the continuation task on the same device.
+    The app is not relaunched so the screen the user left is kept.
+    
+    max_steps is the budget for the whole task: steps already taken before
+    the takeover (resumable_state["step_count"]) are deducted from it. The
+    session is deleted only after the continuation run finishes or hands
+    off to a new takeover session, so a failed resume can be retried.
+    
+    Args:
+        session_id: Session ID returned with the takeover result.
+        reply: User reply describing the manual operation.
+        device_manager: Optional DeviceManager, as for run_parallel_tasks.
+        model_base_url: Overrides the saved model base URL if provided.
+        model_name: Overrides the saved model name if provided.
+        model_api_key: Overrides the saved model API key if provided.
+        max_steps: Overrides the saved max_steps if provided.
+    
+    Returns:
+        Results of the continuation run, or None if the session is unknown or expired.
+    """
+    session_manager = _get_session_manager()
+    state = session_manager.get(session_id)
+    if state is None:
+        return None
+    
+    model_config = ModelConfig(**state.model_config)
+    if model_base_url:
+        model_config.base_url = model_base_url
+    if model_name:
+        model_config.model_name = model_name
+    if model_api_key:
+        model_config.api_key = model_api_key
+    agent_config = AgentConfig(**state.agent_config)
+    if max_steps:
+        agent_config.max_steps = max_steps
+    steps_taken = (state.resumable_state or {}).get("step_count", 0)
+    agent_config.max_steps = max(agent_config.max_steps - steps_taken, 1)
+    
+    info(f"[Takeover同步模式] {state.app_name}: 恢复会话 {session_id}，用户输入: {reply}，剩余步数: {agent_config.max_steps}")
+    task = ParallelTask(
+        device_id=state.device_id,
+        task=f"用户已完成操作（{reply}），继续执行原任务：{state.task}",
+        app_name=state.app_name,
+        app_package=state.app_package,
+        launch_app=False,
+    )
+    results = run_parallel_tasks(
+        [task],
+        model_config,
+        agent_config,
+        task_id=state.task_id,
+        user_id=state.user_id,
+        keyword=state.keyword,
+        mongodb_connection_string=None,
+        device_manager=device_manager,
+    )
+    if any(r.success or r.stop_reason == "INFO_ACTION_NEEDS_REPLY" for r in results):
+        session_manager.delete(session_id)
+    return results
+
+
+# Built-in app configuration used when no apps config file is provided
+_DEFAULT_APPS_CONFIG: Mapping[str, Dict[str, Any]] = MappingProxyType({
+    "app1": {
+        "package": "com.sankuai.meituan",
+        "name": "美团",
+        "instruction_template": "1. 已经打开美团app, 点击进入'外卖'页面\n2. 在搜索结果中找到对应品牌/商家的商品并购买\"{product_name}\"（遵循系统规则d)，优先选择不包含数量关键词的商品，数量默认为1，除非用户明确指定）\n3. 价格识别规则（按顺序执行，必须严格遵守）：\n   - 如果进入订单确认页面（看到\"去结算\"等按钮），必须完成以下操作（按顺序执行，不能跳过）：\n     * 第一步：点击使用默认地址（如果未选择）\n     * 第二步（关键）：如果看到\"美团红包\"区域显示\"待使用 X元红包 >\"或\"还有¥X红包可用>\"，必须立即点击该红包区域（点击\"待使用 X元红包 >\"或\"还有¥X红包可用>\"这个可点击的文本区域），进入红包选择页面\n     * 第三步：在红包选择页面，如果有可用的红包（显示\"可用红包\"），必须选择一个红包并点击\"确认\"按钮来使用红包\n     * 第四步：点击确认后，必须等待页面返回订单确认页面，并等待页面价格更新，然后重新查看页面底部的\"合计\"或\"总计\"价格，确保看到的是使用红包后的最终价格（如果价格没有变化，说明红包没有成功使用，需要重新尝试）\n     * 第五步：只有在确认红包已使用且价格已更新后，才能提取价格信息并完成任务\n   - **重要**：在订单确认页面，绝对不要点击\"提交订单\"、\"立即支付\"或任何支付相关的按钮。只需要识别价格信息后立即finish。\n   - 输出格式：商家：XXX，优惠后价格¥X.X，打包费¥X.X，配送费¥X.X，合计¥XX.X（严格按照系统规则h)的格式要求）"
+    },
+    "app2": {
+        "package": "com.jd.waimai",
+        "name": "京东外卖",
+        "instruction_template": "1. 已经打开京东外卖app\n2. 在搜索结果中按照系统规则11进行搜索：当前任务要搜索的关键词是\"{product_name}\"，绝对不要点击任何搜索历史记录或推荐关键词（包括\"瑞幸咖啡\"等历史项），必须只在搜索框中输入\"{product_name}\"进行搜索。\n3. 在搜索结果中找到对应品牌/商家的商品并加入购物车（遵循系统规则d)，优先选择不包含数量关键词的商品，数量默认为1，除非用户明确指定）\n4. 点击\"去结算\"或\"领券结算\"进入结算页面\n5. 价格识别规则（按顺序执行，必须严格遵守）：\n   - 在结算页面（看到\"立即支付\"按钮）识别价格信息\n   - **绝对禁止**：在结算页面/订单确认页面，绝对不要点击\"立即支付\"、\"提交订单\"或任何支付相关的按钮。只需要识别价格信息后立即finish。\n   - 输出格式：商家：XXX，优惠后价格¥X.X，打包费¥X.X，运费¥X.X，应付总额¥XX.X（严格按照系统规则h)的格式要求）"
+    },
+    "app3": {
+        "package": "com.taobao.shangou",
+        "name": "淘宝闪购",
+        "instruction_template": "**严格限制**：禁止使用浏览器地址栏、打开新标签页或导航到其他网站，只能在淘宝闪购页面内操作。\n1. 已经打开淘宝闪购网页版 - 如果出现\"无法获取定位\"的对话框，点击选择地址按钮; 然后点击收货地址下面的第一条地址\n2. 在搜索结果中找到对应品牌/商家的商品并加入购物车（遵循系统规则d)，优先选择不包含数量关键词的商品，数量默认为1，除非用户明确指定）\n3. 点击\"去结算\"进入结算页面\n4. 价格识别规则（重要）：\n   - 在结算页面（看到\"提交订单\"或\"立即支付\"按钮）识别价格信息\n   - **重要**：绝对不要点击\"提交订单\"、\"立即支付\"或任何支付相关的按钮。只需要识别价格信息后立即finish。\n   - 输出格式：商家：XXX，商品单价¥XX.X，打包费¥X.X，配送费¥X.X，合计¥XX.X（严格按照系统规则h)的格式要求）"
+    }
+})
+
+try:
+    import orjson as _json_backend
+except ImportError:
+    _json_backend = json
+
+# Parsed config files keyed by path, stored with the (mtime_ns, size) they were parsed at
+_CONFIG_CACHE: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+
+
 def _load_json_config(config_path: Optional[str]) -> Any:
-    if config_path and Path(config_path).exists():
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+    """Load a JSON config file, reusing the parsed result while the file is unchanged.
+    
+    Callers get their own deep copy, so in-place edits never leak into the cache.
+    """
+    if not config_path:
+        return {}
+    try:
+        st = Path(config_path).stat()
+    except FileNotFoundError:
+        return {}
+    # mtime alone misses rewrites within one timestamp tick on coarse filesystems
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _CONFIG_CACHE.get(config_path)
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, _json_backend.loads(Path(config_path).read_bytes()))
+        _CONFIG_CACHE[config_path] = cached
+    return copy.deepcopy(cached[1])
 
 def load_devices_config(config_path: Optional[str] = None) -> Dict[str, str]:
     return _load_json_config(config_path) if config_path else {}
 
-def load_apps_config(config_path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+def load_apps_config(config_path: Optional[str] = None) -> Mapping[str, Dict[str, Any]]:
     if config_path:
         config = _load_json_config(config_path)
         if config:
             return config
     
-    return {
-        "app1": {
-            "package": "com.sankuai.meituan",
-            "name": "美团",
-            "instruction_template": "1. 已经打开美团app, 点击进入'外卖'页面\n2. 在搜索结果中找到对应品牌/商家的商品并购买\"{product_name}\"（遵循系统规则d)，优先选择不包含数量关键词的商品，数量默认为1，除非用户明确指定）\n3. 价格识别规则（按顺序执行，必须严格遵守）：\n   - 如果进入订单确认页面（看到\"去结算\"等按钮），必须完成以下操作（按顺序执行，不能跳过）：\n     * 第一步：点击使用默认地址（如果未选择）\n     * 第二步（关键）：如果看到\"美团红包\"区域显示\"待使用 X元红包 >\"或\"还有¥X红包可用>\"，必须立即点击该红包区域（点击\"待使用 X元红包 >\"或\"还有¥X红包可用>\"这个可点击的文本区域），进入红包选择页面\n     * 第三步：在红包选择页面，如果有可用的红包（显示\"可用红包\"），必须选择一个红包并点击\"确认\"按钮来使用红包\n     * 第四步：点击确认后，必须等待页面返回订单确认页面，并等待页面价格更新，然后重新查看页面底部的\"合计\"或\"总计\"价格，确保看到的是使用红包后的最终价格（如果价格没有变化，说明红包没有成功使用，需要重新尝试）\n     * 第五步：只有在确认红包已使用且价格已更新后，才能提取价格信息并完成任务\n   - **重要**：在订单确认页面，绝对不要点击\"提交订单\"、\"立即支付\"或任何支付相关的按钮。只需要识别价格信息后立即finish。\n   - 输出格式：商家：XXX，优惠后价格¥X.X，打包费¥X.X，配送费¥X.X，合计¥XX.X（严格按照系统规则h)的格式要求）"
-        },
-        "app2": {
-            "package": "com.jd.waimai",
-            "name": "京东外卖",
-            "instruction_template": "1. 已经打开京东外卖app\n2. 在搜索结果中按照系统规则11进行搜索：当前任务要搜索的关键词是\"{product_name}\"，绝对不要点击任何搜索历史记录或推荐关键词（包括\"瑞幸咖啡\"等历史项），必须只在搜索框中输入\"{product_name}\"进行搜索。\n3. 在搜索结果中找到对应品牌/商家的商品并加入购物车（遵循系统规则d)，优先选择不包含数量关键词的商品，数量默认为1，除非用户明确指定）\n4. 点击\"去结算\"或\"领券结算\"进入结算页面\n5. 价格识别规则（按顺序执行，必须严格遵守）：\n   - 在结算页面（看到\"立即支付\"按钮）识别价格信息\n   - **绝对禁止**：在结算页面/订单确认页面，绝对不要点击\"立即支付\"、\"提交订单\"或任何支付相关的按钮。只需要识别价格信息后立即finish。\n   - 输出格式：商家：XXX，优惠后价格¥X.X，打包费¥X.X，运费¥X.X，应付总额¥XX.X（严格按照系统规则h)的格式要求）"
-        },
-        "app3": {
-            "package": "com.taobao.shangou",
-            "name": "淘宝闪购",
-            "instruction_template": "**严格限制**：禁止使用浏览器地址栏、打开新标签页或导航到其他网站，只能在淘宝闪购页面内操作。\n1. 已经打开淘宝闪购网页版 - 如果出现\"无法获取定位\"的对话框，点击选择地址按钮; 然后点击收货地址下面的第一条地址\n2. 在搜索结果中找到对应品牌/商家的商品并加入购物车（遵循系统规则d)，优先选择不包含数量关键词的商品，数量默认为1，除非用户明确指定）\n3. 点击\"去结算\"进入结算页面\n4. 价格识别规则（重要）：\n   - 在结算页面（看到\"提交订单\"或\"立即支付\"按钮）识别价格信息\n   - **重要**：绝对不要点击\"提交订单\"、\"立即支付\"或任何支付相关的按钮。只需要识别价格信息后立即finish。\n   - 输出格式：商家：XXX，商品单价¥XX.X，打包费¥X.X，配送费¥X.X，合计¥XX.X（严格按照系统规则h)的格式要求）"
-        }
-    }
+    return _DEFAULT_APPS_CONFIG
+
+
+# 常见商家名称列表
+_COMMON_SELLERS = (
+    "星巴克", "瑞幸", "霸王茶姬", "喜茶", "奈雪的茶", "lavazza", "库迪", "tims",
+    "一点点", "CoCo都可", "蜜雪冰城", "茶百道", "书亦烧仙草",
+    "麦当劳", "肯德基", "汉堡王", "必胜客", "达美乐",
+    "海底捞", "呷哺呷哺", "小龙坎", "大龙燚",
+)
+# 按长度从长到短排序，优先匹配长名称
+_SELLERS_BY_LENGTH = tuple(sorted(_COMMON_SELLERS, key=len, reverse=True))
+_COMMON_SELLER_RE = re.compile("|".join(map(re.escape, _SELLERS_BY_LENGTH)))
+
+# 任务描述中需要去掉的动词/数量前缀
+_VERB_PREFIXES = ("打开", "购买", "点", "要", "来")
+_QTY_PREFIXES = ("一杯", "一份", "一个")
+_TASK_PREFIXES = _VERB_PREFIXES + _QTY_PREFIXES
+_TASK_SUFFIX_RE = re.compile(r"\s*(?:的|附近|购买|点|要|来|一杯|一份|一个)$")
+# "附近XX的" 中的商家名
+_NEARBY_RE = re.compile(r"附近(.+?)的")
+# 英文品牌 + 中文商品，如 "Manner咖啡"
+_ENG_CN_SPLIT_RE = re.compile(r'^([a-zA-Z][a-zA-Z0-9]{1,})([\u4e00-\u9fa5]+.*)$')
+# 中文品牌 + 中文商品，如 "霸王茶姬伯牙绝弦"
+_CN_SPLIT_RE = re.compile(r'^([\u4e00-\u9fa5]{2,4})([\u4e00-\u9fa5]{2,}.*)$')
+# 以这些前缀开头的词视为商品名而非商家名
+_COMMON_PRODUCT_PREFIXES = ('抹茶', '奶茶', '咖啡', '拿铁', '美式', '卡布', '摩卡', '拿', '茶', '奶')
+
+
+def _strip_task_prefix(text: str, prefixes: Tuple[str, ...]) -> str:
+    """Strip one leading prefix from ``prefixes`` plus the whitespace after it."""
+    for prefix in prefixes:
+        if text.startswith(prefix):
+            return text[len(prefix):].lstrip()
+    return text
 
 
 def extract_product_and_seller(task: str) -> Tuple[Optional[str], Optional[str]]:
@@ -738,19 +1033,16 @@ def extract_product_and_seller(task: str) -> Tuple[Optional[str], Optional[str]]
     if not task:
         return None, None
     
-    # 常见商家名称列表（按长度从长到短排序，优先匹配长名称）
-    common_sellers = [
-        "星巴克", "瑞幸", "霸王茶姬", "喜茶", "奈雪的茶", "lavazza", "库迪", "tims",
-        "一点点", "CoCo都可", "蜜雪冰城", "茶百道", "书亦烧仙草",
-        "麦当劳", "肯德基", "汉堡王", "必胜客", "达美乐",
-        "海底捞", "呷哺呷哺", "小龙坎", "大龙燚",
-    ]
-    
     # 尝试匹配商家名称（从长到短）
     seller_name = None
     product_name = task
     
-    for seller in sorted(common_sellers, key=len, reverse=True):
+    # 一次扫描判断是否包含任何已知商家，未命中时跳过逐个商家的匹配
+    sellers = _SELLERS_BY_LENGTH if _COMMON_SELLER_RE.search(task) else ()
+    
+    for seller in sellers:
+        if seller not in task:
+            continue
         # 匹配模式：商家名 + 商品名 或 商品名 + 商家名
         patterns = [
             (rf"^{re.escape(seller)}(.+)$", 1),  # 商家名开头，后面是商品
@@ -764,8 +1056,8 @@ def extract_product_and_seller(task: str) -> Tuple[Optional[str], Optional[str]]
             if match:
                 seller_name = seller
                 product_part = match.group(group_idx).strip() if match.groups() else task.replace(seller, "").strip()
-                product_part = re.sub(r"^(打开|购买|点|要|来|一杯|一份|一个)\s*", "", product_part, flags=re.IGNORECASE)
-                product_part = re.sub(r"\s*(的|附近|购买|点|要|来|一杯|一份|一个)$", "", product_part, flags=re.IGNORECASE)
+                product_part = _strip_task_prefix(product_part, _TASK_PREFIXES)
+                product_part = _TASK_SUFFIX_RE.sub("", product_part)
                 product_part = product_part.replace("的", "").strip()
                 if seller in product_part:
                     product_part = product_part.replace(seller, "").strip()
@@ -773,53 +1065,83 @@ def extract_product_and_seller(task: str) -> Tuple[Optional[str], Optional[str]]
                     product_name = product_part
                 elif not product_part:
                     product_name = task.replace(seller, "").strip()
-                    product_name = re.sub(r"^(打开|购买|点|要|来)\s*", "", product_name, flags=re.IGNORECASE)
+                    product_name = _strip_task_prefix(product_name, _VERB_PREFIXES)
                 break
         
         if seller_name:
             break
     
     if not seller_name:
-        nearby_pattern = r"附近(.+?)的"
-        match = re.search(nearby_pattern, task)
+        match = _NEARBY_RE.search(task)
         if match:
             potential_seller = match.group(1).strip()
-            for seller in common_sellers:
+            for seller in _COMMON_SELLERS:
                 if seller in potential_seller or potential_seller in seller:
                     seller_name = seller
-                    product_name = re.sub(nearby_pattern, "", task).strip()
-                    product_name = re.sub(r"^(打开|购买|点|要|来)\s*", "", product_name, flags=re.IGNORECASE)
+                    product_name = _NEARBY_RE.sub("", task).strip()
+                    product_name = _strip_task_prefix(product_name, _VERB_PREFIXES)
                     product_name = product_name.replace("的", "").strip()
                     break
     
     if product_name:
-        product_name = re.sub(r"^(打开|购买|点|要|来|一杯|一份|一个)\s*", "", product_name, flags=re.IGNORECASE)
+        product_name = _strip_task_prefix(product_name, _TASK_PREFIXES)
         product_name = product_name.strip()
         if not product_name:
             product_name = None
     
     if not seller_name and product_name:
-        pattern1 = r'^([a-zA-Z][a-zA-Z0-9]{1,})([\u4e00-\u9fa5]+.*)$'
-        match = re.match(pattern1, product_name)
+        match = _ENG_CN_SPLIT_RE.match(product_name)
         if match:
             english_part = match.group(1)
             chinese_part = match.group(2)
             if len(english_part) >= 2:
                 product_name = f"{english_part} {chinese_part}"
         elif ' ' not in product_name:
-            common_product_prefixes = ['抹茶', '奶茶', '咖啡', '拿铁', '美式', '卡布', '摩卡', '拿', '茶', '奶']
-            pattern2 = r'^([\u4e00-\u9fa5]{2,4})([\u4e00-\u9fa5]{2,}.*)$'
-            match = re.match(pattern2, product_name)
+            match = _CN_SPLIT_RE.match(product_name)
             if match:
                 potential_seller = match.group(1)
                 potential_product = match.group(2)
                 if (len(potential_seller) >= 2 and len(potential_product) >= 2 and 
-                    not any(potential_seller.startswith(prefix) for prefix in common_product_prefixes)):
+                    not potential_seller.startswith(_COMMON_PRODUCT_PREFIXES)):
                     product_name = f"{potential_seller} {potential_product}"
     
     return product_name, seller_name
 
 
+# App keys in task build order: jd -> tb -> mt
+_APP_BUILD_ORDER = ("app2", "app3", "app1")
+
+# Placeholders instruction templates may use
+_TEMPLATE_FIELDS = frozenset({"product_name", "seller_name"})
+
+
+@lru_cache(maxsize=32)
+def _compile_template(template: str) -> Optional[Tuple[Tuple[str, Optional[str]], ...]]:
+    """Split a str.format template into (literal, field) pairs once.
+    
+    Returns None when the template uses anything beyond plain known
+    placeholders, so the caller falls back to str.format.
+    """
+    try:
+        parts = tuple(string.Formatter().parse(template))
+    except ValueError:
+        return None
+    for _, field_name, format_spec, conversion in parts:
+        if field_name is not None and (field_name not in _TEMPLATE_FIELDS or format_spec or conversion):
+            return None
+    return tuple((literal, field_name) for literal, field_name, _, _ in parts)
+
+
+def _render_template(template: str, **values: str) -> str:
+    compiled = _compile_template(template)
+    if compiled is None:
+        return template.format(**values)
+    return "".join(
+        literal if field_name is None else literal + values[field_name]
+        for literal, field_name in compiled
+    )
+
+
 def build_tasks_from_configs(
     apps_config: Dict[str, Dict[str, Any]],
     task_template: Optional[str] = None,
@@ -841,47 +1163,53 @@ def build_tasks_from_configs(
     Returns:
         List of ParallelTask objects.
     """
-    tasks = []
+    # Resolve (app_info, app_name, app_type, device_id) up front so the build loop only formats tasks
+    resolved = []
+    device_mapping = app_to_device_mapping or {}
     
-    # Build tasks in order: jd -> tb -> mt
-    app_order = ["app2", "app3", "app1"]  # jd, tb, mt
-    
-    for app_key in app_order:
-        if app_key not in apps_config:
+    for app_key in _APP_BUILD_ORDER:
+        app_info = apps_config.get(app_key)
+        if app_info is None:
             continue
         
-        app_info = apps_config[app_key]
         app_name = app_info.get('name', app_key)
         app_type = _APP_TYPE_MAP.get(app_name)
         
         # Get device_id from MongoDB mapping
-        device_id = None
-        if app_to_device_mapping and app_type and app_type in app_to_device_mapping:
-            device_id = app_to_device_mapping[app_type]
+        device_id = device_mapping.get(app_type) if app_type else None
+        if device_id:
             debug(f"[调试] {app_name} ({app_type}): 使用 MongoDB device={device_id}")
-        
-        if not device_id:
+        else:
             warning(f"[警告] {app_name} ({app_type}): 未找到 device_id，跳过此应用")
             continue
         
-        app_package = app_info.get('package')
+        resolved.append((app_info, app_name, app_type, device_id))
+    
+    tasks = []
+    tasks_append = tasks.append
+    
+    for app_info, app_name, app_type, device_id in resolved:
+        info_get = app_info.get
+        app_package = info_get('package')
         task = None
         
         if product_name:
-            instruction_template = app_info.get('instruction_template')
+            instruction_template = info_get('instruction_template')
             if instruction_template:
+                # 仅在有 seller_name 时才会再检查占位符，此时 template 即 instruction_template
                 needs_seller = '{seller_name}' in instruction_template
                 if needs_seller and not seller_name:
-                    template = app_info.get('instruction_template_no_seller') or instruction_template
+                    template = info_get('instruction_template_no_seller') or instruction_template
                 else:
                     template = instruction_template
                 
                 if template:
-                    task = template.format(
+                    task = _render_template(
+                        template,
                         product_name=product_name,
                         seller_name=seller_name or ''
                     )
-                    if seller_name and '{seller_name}' not in template:
+                    if seller_name and not needs_seller:
                         task = f"注意：品牌/商家名称是\"{seller_name}\"，商品名称是\"{product_name}\"。{task}"
                     elif not seller_name:
                         task = f"当前任务：搜索并购买\"{product_name}\"。{task}"
@@ -892,11 +1220,12 @@ def build_tasks_from_configs(
         if app_name:
             task = f"[App: {app_name}]\n{task}"
         
-        tasks.append(ParallelTask(
+        tasks_append(ParallelTask(
             device_id=device_id,
             task=task,
             app_name=app_name,
             app_package=app_package,
+            app_type=app_type,
         ))
     
     return tasks
\ No newline at end of file
@@ -1,7 +1,111 @@
 """Price extraction from finish messages."""
 
 import re
-from typing import Optional, Dict
+from functools import lru_cache
+from typing import Optional, Dict, Pattern, Sequence, Tuple
+
+
+_BOLD_RE = re.compile(r'\*\*([^*]+)\*\*')
+_DIGIT_RE = re.compile(r'\d')
+
+_PACK_FEE_RES = (
+    re.compile(r"(?:打包|包装)费[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+)
+
+_DELIVERY_FEE_RES = (
+    re.compile(r"(?:运费|配送费)[：:]?\s*¥?\s*(\d+(?:\.\d+)?)(?:\s*¥?\s*\d+(?:\.\d+)?)?"),
+    re.compile(r"另需配送费约[：:]?\s*¥(\d+(?:\.\d+)?)"),
+)
+
+_TOTAL_FEE_RES = (
+    re.compile(r"(?:订单总价|合计|应付总额)[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"总价[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"价格信息[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"购物车总价[：:为]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"总计[：:]?\s*(?:已优惠[^¥]*)?¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"价格[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"优惠价[：:]?\s*¥?\s*(\d+(?:\.\d+)?)(?:（到手价）)?"),
+)
+
+_PRICE_RES = (
+    re.compile(r"优惠后(?:商品)?价格[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"商品(?:单价|金额|价格)[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"优惠后[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"单件预估[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"商品[：:]\s*[^¥]*?-\s*¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"优惠价[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"原价[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+)
+
+_COUPON_PRICE_RES = (
+    re.compile(r"券后约?[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"单件预估[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"价格[：:是]?\s*¥?\s*(\d+(?:\.\d+)?)(?:/件|/杯|/份|/个)?"),
+    re.compile(r"商品(?:价格|单价)[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"价格信息[：:]?\s*¥?\s*(\d+(?:\.\d+)?)"),
+)
+
+# Field -> patterns in priority order, looked up in turn by _extract_price_fields
+_PRICE_FIELD_RES = (
+    ('pack_fee', _PACK_FEE_RES),
+    ('delivery_fee', _DELIVERY_FEE_RES),
+    ('total_fee', _TOTAL_FEE_RES),
+    ('price', _PRICE_RES),
+)
+# Fallback price patterns, only scanned when the minimum order price is not met
+_COUPON_PRICE_FIELD_RES = (
+    ('price', _COUPON_PRICE_RES),
+)
+
+_MINIMUM_AMOUNT_RES = (
+    re.compile(r"(?:还)?差[：:：]?\s*¥\s*(\d+)\s*起送"),  # "差¥2起送" or "还差¥2起送" (no 元)
+    re.compile(r"(?:还)?差[：:：]?\s*¥?\s*(\d+)\s*元(?:起送|起达)"),  # "差2元起送" or "还差2元起达"
+    re.compile(r"满\d+元起送[，,]\s*还差[：:：]?\s*¥?\s*(\d+)\s*元"),  # "满20元起送，还差2元"
+    re.compile(r"(?:还)?差[：:：]?\s*¥?\s*(\d+)\s*(?:元|达到起送费|才能达到起送费)"),  # "差：¥3达到起送费"
+)
+
+# Any fallback hit leads to the same amount lookup, so one alternation suffices
+_MINIMUM_FALLBACK_RE = re.compile(
+    r"去凑单"
+    r"|差.*[元¥]?\d+.*起送"
+    r"|还差.*[元¥]?\d+.*起送"
+    r"|还差.*[元¥]?\d+.*起达"
+    r"|未满足起送价"
+    r"|起送价未满足"
+)
+
+_MINIMUM_FALLBACK_AMOUNT_RE = re.compile(r"(?:还)?差[：:：]?\s*¥?\s*(\d+)")
+
+try:
+    import re2 as _re2
+except ImportError:
+    _re2 = None
+
+
+def _compile_linear(pattern: str) -> Pattern[str]:
+    """Compile with RE2 (linear-time, no backtracking) when available, else with re."""
+    if _re2 is not None:
+        try:
+            # RE2's \d is ASCII-only; \p{Nd} keeps Python's Unicode digit semantics
+            return _re2.compile(pattern.replace(r"\d", r"\p{Nd}"))
+        except Exception:
+            pass
+    return re.compile(pattern)
+
+
+# Match formats like: "差¥2起送", "差2元起送", "还差¥2起送", "还差2元起送", "去凑单", etc.
+_COUPON_RE = _compile_linear(r'差.*?[元¥]?\d+.*?起送|还差.*?[元¥]?\d+.*?起送|去凑单|凑单助手|满.*元起送.*差.*元|还差[：:]\s*¥?\s*\d+达到起送费|还差¥?\s*\d+才能达到起送费')
+
+# 移除过于宽泛的"手机号"，避免误判结算页面的联系人信息
+_LOGIN_KEYWORDS = ("登录", "验证码", "请输入手机号", "请输入验证码", "获取验证码", "同意协议并登录", "登录页面", "需要登录", "未登录", "人机验证", "真人验证", "需要真人完成验证", "手机号登录", "手机号验证")
+_PRIVACY_KEYWORDS = ("隐私政策", "隐私协议", "隐私政策协议", "用户协议", "温馨提示")
+
+# Keyword lists fused into one alternation each: a single scan instead of one per keyword
+_LOGIN_RE = re.compile("|".join(map(re.escape, _LOGIN_KEYWORDS)))
+_PRIVACY_RE = re.compile("|".join(map(re.escape, _PRIVACY_KEYWORDS)))
+
+# Texts longer than this skip the memo so large messages don't pin cache memory
+_MEMO_MAX_LEN = 4096
 
 
 def extract_price_from_message(message: str, app_name: Optional[str] = None) -> Optional[Dict[str, float]]:
@@ -35,52 +139,25 @@ def extract_price_from_message(message: str, app_name: Optional[str] = None) ->
         pack_fee (包装费), total_fee (总计, may be None)
         or None if both price and total_fee extraction fail
     """
-    if not message:
+    # Every price pattern captures a number; without a digit nothing can match
+    if not message or not _DIGIT_RE.search(message):
         return None
     
-    message = re.sub(r'\*\*([^*]+)\*\*', r'\1', message)
+    if '**' in message:
+        message = _BOLD_RE.sub(r'\1', message)
     
     is_minimum_price_not_met = is_coupon_scenario(message)
     
-    pack_fee = _extract_price_by_patterns(message, [
-        r"(?:打包|包装)费[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-    ]) or 0.0
-    
-    delivery_fee = _extract_price_by_patterns(message, [
-        r"(?:运费|配送费)[：:]?\s*¥?\s*(\d+(?:\.\d+)?)(?:\s*¥?\s*\d+(?:\.\d+)?)?",
-        r"另需配送费约[：:]?\s*¥(\d+(?:\.\d+)?)",
-    ]) or 0.0
-    
-    total_fee = _extract_price_by_patterns(message, [
-        r"(?:订单总价|合计|应付总额)[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-        r"总价[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-        r"价格信息[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-        r"购物车总价[：:为]?\s*¥?\s*(\d+(?:\.\d+)?)",
-        r"总计[：:]?\s*(?:已优惠[^¥]*)?¥?\s*(\d+(?:\.\d+)?)",
-        r"价格[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-        r"优惠价[：:]?\s*¥?\s*(\d+(?:\.\d+)?)(?:（到手价）)?",
-    ])
-    
-    price = _extract_price_by_patterns(message, [
-        r"优惠后(?:商品)?价格[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-        r"商品(?:单价|金额|价格)[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-        r"优惠后[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-        r"单件预估[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-        r"商品[：:]\s*[^¥]*?-\s*¥?\s*(\d+(?:\.\d+)?)",
-        r"优惠价[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-        r"原价[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-        ])
+    fields = _extract_price_fields(message, _PRICE_FIELD_RES)
+    pack_fee = fields['pack_fee'] or 0.0
+    delivery_fee = fields['delivery_fee'] or 0.0
+    total_fee = fields['total_fee']
+    price = fields['price']
     
     if is_minimum_price_not_met:
         total_fee = 0.0
         if price is None:
-            price = _extract_price_by_patterns(message, [
-                r"券后约?[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-                r"单件预估[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-                r"价格[：:是]?\s*¥?\s*(\d+(?:\.\d+)?)(?:/件|/杯|/份|/个)?",
-                r"商品(?:价格|单价)[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-                r"价格信息[：:]?\s*¥?\s*(\d+(?:\.\d+)?)",
-            ])
+            price = _extract_price_fields(message, _COUPON_PRICE_FIELD_RES)['price']
         if price is not None or delivery_fee > 0:
             return {
                 'price': price or 0.0,
@@ -111,40 +188,24 @@ def detect_minimum_price(message: str) -> Optional[str]:
     Returns:
         "差X元起送" if minimum price not met (X is the amount needed), None otherwise
     """
-    if not message:
+    # Every amount pattern, including the fallback, needs "差"
+    if not message or "差" not in message:
         return None
     
-    message = re.sub(r'\*\*([^*]+)\*\*', r'\1', message)
-    
-    amount_patterns = [
-        r"(?:还)?差[：:：]?\s*¥\s*(\d+)\s*起送",  # "差¥2起送" or "还差¥2起送" (no 元)
-        r"(?:还)?差[：:：]?\s*¥?\s*(\d+)\s*元(?:起送|起达)",  # "差2元起送" or "还差2元起达"
-        r"满\d+元起送[，,]\s*还差[：:：]?\s*¥?\s*(\d+)\s*元",  # "满20元起送，还差2元"
-        r"(?:还)?差[：:：]?\s*¥?\s*(\d+)\s*(?:元|达到起送费|才能达到起送费)",  # "差：¥3达到起送费"
-    ]
+    if '**' in message:
+        message = _BOLD_RE.sub(r'\1', message)
     
-    for pattern in amount_patterns:
-        match = re.search(pattern, message)
+    for pattern in _MINIMUM_AMOUNT_RES:
+        match = pattern.search(message)
         if match:
             amount = match.group(1)
             return f"差{amount}元起送"
     
-    fallback_keywords = [
-        r"去凑单",
-        r"差.*[元¥]?\d+.*起送",
-        r"还差.*[元¥]?\d+.*起送",
-        r"还差.*[元¥]?\d+.*起达",
-        r"未满足起送价",
-        r"起送价未满足",
-    ]
-    
-    for keyword in fallback_keywords:
-        if re.search(keyword, message):
-            fallback_match = re.search(r"(?:还)?差[：:：]?\s*¥?\s*(\d+)", message)
-            if fallback_match:
-                amount = fallback_match.group(1)
-                return f"差{amount}元起送"
-            return None
+    if _MINIMUM_FALLBACK_RE.search(message):
+        fallback_match = _MINIMUM_FALLBACK_AMOUNT_RE.search(message)
+        if fallback_match:
+            amount = fallback_match.group(1)
+            return f"差{amount}元起送"
     
     return None
 
@@ -164,10 +225,7 @@ def is_coupon_scenario(text: str) -> bool:
     """
     if not text:
         return False
-    # Use same pattern as extract_price_from_message for consistency
-    # Match formats like: "差¥2起送", "差2元起送", "还差¥2起送", "还差2元起送", "去凑单", etc.
-    coupon_pattern = r'差.*?[元¥]?\d+.*?起送|还差.*?[元¥]?\d+.*?起送|去凑单|凑单助手|满.*元起送.*差.*元|还差[：:]\s*¥?\s*\d+达到起送费|还差¥?\s*\d+才能达到起送费'
-    return bool(re.search(coupon_pattern, text))
+    return _text_matches(_COUPON_RE, text)
 
 
 def is_login_page(text: str) -> bool:
@@ -185,9 +243,7 @@ def is_login_page(text: str) -> bool:
     """
     if not text:
         return False
-    # 移除过于宽泛的"手机号"，避免误判结算页面的联系人信息
-    login_keywords = ["登录", "验证码", "请输入手机号", "请输入验证码", "获取验证码", "同意协议并登录", "登录页面", "需要登录", "未登录", "人机验证", "真人验证", "需要真人完成验证", "手机号登录", "手机号验证"]
-    return any(keyword in text for keyword in login_keywords)
+    return _text_matches(_LOGIN_RE, text)
 
 
 def is_privacy_policy_page(text: str) -> bool:
@@ -202,14 +258,36 @@ def is_privacy_policy_page(text: str) -> bool:
     """
     if not text:
         return False
-    privacy_keywords = ["隐私政策", "隐私协议", "隐私政策协议", "用户协议", "温馨提示"]
-    return any(keyword in text for keyword in privacy_keywords)
+    return _text_matches(_PRIVACY_RE, text)
 
 
-def _extract_price_by_patterns(text: str, patterns: list) -> Optional[float]:
-    """Extract price using multiple regex patterns."""
-    for pattern in patterns:
-        match = re.search(pattern, text)
-        if match:
-            return float(match.group(1))
-    return None
\ No newline at end of file
+@lru_cache(maxsize=2048)
+def _cached_text_matches(pattern: Pattern[str], text: str) -> bool:
+    return pattern.search(text) is not None
+
+
+def _text_matches(pattern: Pattern[str], text: str) -> bool:
+    """Search text with pattern, memoizing results for short texts."""
+    if len(text) > _MEMO_MAX_LEN:
+        return pattern.search(text) is not None
+    return _cached_text_matches(pattern, text)
+
+
+def _extract_price_fields(
+    text: str, fields: Sequence[Tuple[str, Sequence[Pattern[str]]]]
+) -> Dict[str, Optional[float]]:
+    """Extract several price fields from a (field, patterns) table.
+    
+    Fields are looked up one after another; for each field the patterns are
+    searched in priority order and the first match wins.
+    """
+    results: Dict[str, Optional[float]] = {}
+    for name, patterns in fields:
+        value = None
+        for pattern in patterns:
+            match = pattern.search(text)
+            if match:
+                value = float(match.group(1))
+                break
+        results[name] = value
+    return results
@@ -1,14 +1,53 @@
 """Screenshot cache for reducing redundant ADB calls."""
 
-import time
+from time import monotonic
 from typing import Any, Callable
 
 
+def make_screenshot_cache(get_screenshot_fn: Callable, max_age: float = 1.0) -> Callable:
+    """Build a cached screenshot getter.
+
+    The cache state lives in closure variables, so the hot cache-hit path
+    only touches locals. The returned ``get(force_refresh=False)`` function
+    carries an ``invalidate()`` attribute that drops the cached screenshot.
+
+    Args:
+        get_screenshot_fn: Function to capture screenshot (device_id already bound).
+        max_age: Cache validity in seconds (default: 1.0).
+
+    Returns:
+        The ``get`` function.
+    """
+    cached: Any = None
+    deadline = 0.0
+
+    def get(force_refresh: bool = False):
+        nonlocal cached, deadline
+        now = monotonic()
+        if not force_refresh and cached is not None and now < deadline:
+            return cached
+        cached = get_screenshot_fn()
+        deadline = now + max_age
+        return cached
+
+    def invalidate() -> None:
+        nonlocal cached, deadline
+        cached = None
+        deadline = 0.0
+
+    get.invalidate = invalidate
+    return get
+
+
 class ScreenshotCache:
     """Caches screenshots to reduce ADB calls.
-    
+
     The cache is valid for a time window (max_age seconds). If a screenshot
     is requested within this window, the cached version is returned.
+
+    Thin wrapper over make_screenshot_cache: ``get(force_refresh=False)``
+    returns the cached or a fresh screenshot, ``invalidate()`` forces the
+    next get() to capture a new one.
     """
 
     def __init__(self, get_screenshot_fn: Callable, max_age: float = 1.0):
@@ -17,33 +56,6 @@ class ScreenshotCache:
             get_screenshot_fn: Function to capture screenshot (device_id already bound).
             max_age: Cache validity in seconds (default: 1.0).
         """
-        self._get_screenshot_fn = get_screenshot_fn
-        self._max_age = max_age
-        self._cached: Any = None
-        self._cached_time: float = 0
-
-    def get(self, force_refresh: bool = False):
-        """Get cached screenshot or capture a new one.
-        
-        Args:
-            force_refresh: If True, always capture a new screenshot.
-            
-        Returns:
-            Screenshot object.
-        """
-        current_time = time.time()
-        
-        if not force_refresh and self._cached is not None:
-            age = current_time - self._cached_time
-            if age < self._max_age:
-                return self._cached
-        
-        self._cached = self._get_screenshot_fn()
-        self._cached_time = current_time
-        return self._cached
-
-    def invalidate(self) -> None:
-        """Invalidate the cache, forcing next get() to capture a new screenshot."""
-        self._cached = None
-        self._cached_time = 0
-
+        get = make_screenshot_cache(get_screenshot_fn, max_age)
+        self.get = get
+        self.invalidate = get.invalidate
@@ -9,6 +9,7 @@ OrderWise MCP 模式在 UCloud Sandbox 上的部署脚本
 
 import argparse
 import os
+import re
 import sys
 from pathlib import Path
 
@@ -18,21 +19,17 @@ from ucloud_sandbox import Template, Sandbox, default_build_logger
 PROJECT_ROOT = Path(__file__).parent.parent
 REQUIREMENTS_FILE = PROJECT_ROOT / "requirements.txt"
 TEMPLATE_ALIAS = "orderwise-mcp"
+# 模型部署相关包，MCP 模式不需要（按子串匹配，与包名中的位置无关）
+_EXCLUDE_RE = re.compile(r'vllm|sglang|transformers', re.IGNORECASE)
 
 
 def load_requirements():
     """从 requirements.txt 加载依赖（排除 vllm，MCP 模式使用外部模型服务）"""
     if not REQUIREMENTS_FILE.exists():
         return []
-    exclude_packages = ['vllm', 'sglang', 'transformers']  # 模型部署相关包，MCP 模式不需要
     with open(REQUIREMENTS_FILE, 'r') as f:
-        deps = []
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#'):
-                if not any(pkg in line.lower() for pkg in exclude_packages):
-                    deps.append(line)
-    return deps
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith('#') and not _EXCLUDE_RE.search(line)]
 
 
 def define_template():
@@ -11,23 +11,15 @@ OrderWise 比价工具 - 连接到 Sandbox 中的 MCP 服务器并调用 compare
     python compare_prices.py
 """
 
-import asyncio
 import json
 import os
 import sys
-from fastmcp import Client
 
 
-async def compare_prices_example():
+async def compare_prices_example(mcp_server_url: str):
     """示例：调用 compare_prices 工具进行比价"""
-    
-    # MCP 服务器地址（sandbox 外部访问地址）
-    # 格式: http://{port}-{sandbox_id}.sandbox.ucloudai.com/mcp
-    mcp_server_url = os.getenv("MCP_SERVER_URL")
-    if not mcp_server_url:
-        print("错误: 请设置环境变量 MCP_SERVER_URL")
-        print("例如: export MCP_SERVER_URL=http://8703-{your_sandbox_id}.sandbox.ucloudai.com/mcp")
-        sys.exit(1)
+    # fastmcp 导入较重，延迟到确认配置后再加载
+    from fastmcp import Client
     
     print("=" * 60)
     print("OrderWise MCP Client - 比价示例")
@@ -142,6 +134,19 @@ async def compare_prices_example():
                 break
 
 
+def main():
+    # MCP 服务器地址（sandbox 外部访问地址）
+    # 格式: http://{port}-{sandbox_id}.sandbox.ucloudai.com/mcp
+    mcp_server_url = os.getenv("MCP_SERVER_URL")
+    if not mcp_server_url:
+        print("错误: 请设置环境变量 MCP_SERVER_URL")
+        print("例如: export MCP_SERVER_URL=http://8703-{your_sandbox_id}.sandbox.ucloudai.com/mcp")
+        sys.exit(1)
+    
+    import asyncio
+    asyncio.run(compare_prices_example(mcp_server_url))
+
+
 if __name__ == "__main__":
-    asyncio.run(compare_prices_example())
+    main()
 
@@ -8,58 +8,141 @@ OrderWise MCP 模式 Sandbox 配置脚本
 """
 
 import argparse
+import io
 import json
 import os
+import re
 import sys
+import tarfile
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
 from ucloud_sandbox import Sandbox
 
+from sandbox_utils import PORT_CHECK_CMD, PROC_CHECK_CMD, run_sections
 
-def connect_devices(sandbox: Sandbox, device_ips: list[str], adbkey_path: Optional[str] = None):
-    """连接 Android 设备"""
+
+DEFAULT_ADB_PARALLELISM = 8
+# adb devices 输出中已授权设备的行（"<serial>\tdevice"），不会误匹配表头 "List of devices attached"
+_DEVICE_READY_RE = re.compile(r"\tdevice$", re.MULTILINE)
+# adb connect 地址：主机名 / IPv4 / [IPv6]，端口可选
+_DEVICE_ADDR_RE = re.compile(r"(?:\[[0-9A-Fa-f:.]+\]|[\w.-]+)(?::\d{1,5})?")
+# 在 sandbox 内重试探测 MCP 服务，始终以 0 退出，结果通过 READY/NOT_READY 输出
+_VERIFY_SCRIPT = (
+    "for i in 1 2 3 4 5; do "
+    "if curl -s -m 5 http://localhost:8703/ 2>&1 | grep -qi status; then echo READY; exit 0; fi; "
+    "if [ $i -lt 5 ]; then sleep 2; fi; "
+    "done; echo NOT_READY"
+)
+# 启动后最多等待端口就绪的秒数；进程退出时提前结束
+_READY_TIMEOUT = 30
+_READY_PROBE_SCRIPT = (
+    f"for i in $(seq 1 {_READY_TIMEOUT}); do "
+    "if (ss -tln 2>/dev/null || netstat -tln 2>/dev/null) | grep -q ':8703 '; then echo READY; break; fi; "
+    "sleep 1; "
+    "ps aux | grep -v grep | grep -q order_wise_mcp_server || break; "
+    "done"
+)
+# 本地 ADB 密钥打包后在 sandbox 中的临时上传路径
+_ADBKEY_ARCHIVE_PATH = "/tmp/orderwise_adbkeys.tar"
+
+
+def _read_key_file(path: str) -> Optional[bytes]:
+    """读取本地密钥文件，不存在时返回 None（不先 stat 再 open）"""
+    try:
+        return Path(path).read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _pack_adb_keys(adbkey_path: str) -> Optional[bytes]:
+    """将私钥及对应公钥（如果存在）打包为 tar，只需上传一次；私钥不存在时返回 None"""
+    private_key = _read_key_file(adbkey_path)
+    if private_key is None:
+        return None
+    public_key = _read_key_file(adbkey_path + '.pub')
+    
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w') as tar:
+        for name, data, mode in (("adbkey", private_key, 0o600), ("adbkey.pub", public_key, 0o644)):
+            if data is None:
+                continue
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = mode
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def normalize_device_addrs(device_ips: list[str]) -> list[str]:
+    """去重并过滤格式错误的设备地址（地址会拼接进 shell 命令），保持原有顺序"""
+    valid_ips = []
+    for device_ip in dict.fromkeys(device_ips):
+        if _DEVICE_ADDR_RE.fullmatch(device_ip):
+            valid_ips.append(device_ip)
+        else:
+            print(f"   跳过格式错误的设备地址: {device_ip!r}")
+    return valid_ips
+
+
+def connect_devices(sandbox: Sandbox, device_ips: list[str], adbkey_path: Optional[str] = None,
+                    parallelism: int = DEFAULT_ADB_PARALLELISM):
+    """连接 Android 设备（parallelism 为并发 adb connect 数，1 表示逐个连接）"""
     print("连接 Android 设备...")
     
-    # 重置 ADB 服务器
-    print("   重置 ADB 服务器...")
-    sandbox.commands.run("adb kill-server", timeout=10)
+    device_ips = normalize_device_addrs(device_ips)
+    if not device_ips:
+        print("没有可连接的设备")
+        return
     
-    # 清理旧密钥（无论是否提供新密钥）
-    sandbox.commands.run("rm -f ~/.android/adbkey* 2>/dev/null || true", timeout=10)
-    sandbox.commands.run("mkdir -p ~/.android", timeout=10)
+    # 重置 ADB 服务器，清理旧密钥（无论是否提供新密钥），所有步骤合并为一次 sandbox 命令
+    print("   重置 ADB 服务器...")
+    setup_cmds = [
+        "adb kill-server",
+        "rm -f ~/.android/adbkey* 2>/dev/null || true",
+        "mkdir -p ~/.android",
+    ]
     
+    key_uploaded = False
     if adbkey_path:
         # 使用指定的 adbkey（私钥）
         print(f"   使用指定的 ADB 密钥: {adbkey_path}")
         
-        if os.path.exists(adbkey_path):
-            with open(adbkey_path, 'rb') as f:
-                adbkey_content = f.read()
-            sandbox.files.write("~/.android/adbkey", adbkey_content)
+        key_archive = _pack_adb_keys(adbkey_path)
+        if key_archive is not None:
+            # 私钥和公钥打包上传，清理旧密钥后再解压到 ~/.android
+            sandbox.files.write(_ADBKEY_ARCHIVE_PATH, key_archive)
             # 设置正确的文件权限（ADB 要求私钥权限为 600）
-            sandbox.commands.run("chmod 600 ~/.android/adbkey", timeout=10)
-            
-            # 尝试复制对应的公钥（如果存在）
-            pub_key_path = adbkey_path + '.pub'
-            if os.path.exists(pub_key_path):
-                with open(pub_key_path, 'rb') as f:
-                    pub_key_content = f.read()
-                sandbox.files.write("~/.android/adbkey.pub", pub_key_content)
-                sandbox.commands.run("chmod 644 ~/.android/adbkey.pub", timeout=10)
-            
-            print("   ADB 密钥已复制到 sandbox")
+            setup_cmds += [
+                f"tar -xf {_ADBKEY_ARCHIVE_PATH} -C ~/.android --no-same-owner",
+                f"rm -f {_ADBKEY_ARCHIVE_PATH}",
+                "chmod 600 ~/.android/adbkey",
+                "chmod 644 ~/.android/adbkey.pub 2>/dev/null || true",
+            ]
+            key_uploaded = True
         else:
             print(f"   警告: 本地文件不存在: {adbkey_path}")
             print("   将生成新密钥")
     
     # 启动 ADB 服务器
-    sandbox.commands.run("adb start-server", timeout=10)
+    setup_cmds.append("adb start-server")
+    sandbox.commands.run("; ".join(setup_cmds), timeout=30)
+    if key_uploaded:
+        print("   ADB 密钥已复制到 sandbox")
+    
+    # 每个 adb connect 是独立的 sandbox 命令，可并发执行；结果按设备顺序输出
+    workers = max(1, min(len(device_ips), parallelism))
+    print(f"   连接 {len(device_ips)} 台设备（并发数: {workers}）...")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            lambda device_ip: sandbox.commands.run(f"adb connect {device_ip}", timeout=10),
+            device_ips,
+        ))
     
-    for i, device_ip in enumerate(device_ips, 1):
-        print(f"   连接设备 {i}: {device_ip}...")
-        result = sandbox.commands.run(f"adb connect {device_ip}", timeout=10)
+    for i, (device_ip, result) in enumerate(zip(device_ips, results), 1):
         if result.exit_code == 0:
             print(f"设备 {i} 连接成功: {device_ip}")
         else:
@@ -72,14 +155,18 @@ def connect_devices(sandbox: Sandbox, device_ips: list[str], adbkey_path: Option
     
     if "unauthorized" in result.stdout:
         print("\n设备未授权，等待授权中（最多 60 秒）...")
-        for waited in range(0, 60, 3):
-            time.sleep(3)
+        # 指数退避轮询（1s, 2s, 4s, 8s, 8s...），授权完成立即返回；总等待不超过 60 秒
+        delay, elapsed = 1.0, 0.0
+        while elapsed < 60:
+            wait = min(delay, 60 - elapsed)
+            time.sleep(wait)
+            elapsed += wait
+            delay = min(delay * 2, 8.0)
             result = sandbox.commands.run("adb devices", timeout=10)
-            if "unauthorized" not in result.stdout and "device" in result.stdout:
+            if "unauthorized" not in result.stdout and _DEVICE_READY_RE.search(result.stdout):
                 print("设备已授权")
                 return
-            if waited % 15 == 0 and waited > 0:
-                print(f"   已等待 {waited} 秒...")
+            print(f"   已等待 {elapsed:.0f} 秒...")
         print("等待超时，部分设备可能仍未授权")
 
 
@@ -122,16 +209,22 @@ def start_mcp_server(sandbox: Sandbox, background: bool = True):
     
     if background:
         sandbox.commands.run(f"{cmd} > /tmp/mcp_server.log 2>&1 &", timeout=10)
-        print("MCP 服务器启动命令已执行")
-        time.sleep(30)
+        print("MCP 服务器启动命令已执行，等待端口 8703 就绪...")
+        
+        # 就绪探测、进程检查和启动日志合并为一次 sandbox 命令
+        status = run_sections(sandbox, {
+            "ready": _READY_PROBE_SCRIPT,
+            "proc": PROC_CHECK_CMD,
+            "log": "tail -50 /tmp/mcp_server.log 2>/dev/null || echo '无日志'",
+        }, timeout=_READY_TIMEOUT + 15)
+        if "READY" in status["ready"].split():
+            print("   端口 8703 已就绪")
         
-        proc = sandbox.commands.run("ps aux | grep -v grep | grep order_wise_mcp_server || true", timeout=10)
-        if proc.stdout.strip():
+        if status["proc"].strip():
             print("   进程运行中")
         else:
             print("   进程未找到，查看启动日志:")
-            log = sandbox.commands.run("tail -50 /tmp/mcp_server.log 2>/dev/null || echo '无日志'", timeout=10)
-            print(log.stdout[:500])
+            print(status["log"][:500])
     else:
         result = sandbox.commands.run(cmd, timeout=5)
         if result.exit_code != 0:
@@ -142,20 +235,38 @@ def verify_service(sandbox: Sandbox):
     """验证服务状态"""
     print("\n验证服务状态...")
     
-    for i in range(5):
-        result = sandbox.commands.run("curl -s http://localhost:8703/ 2>&1 || true", timeout=10)
-        if result.exit_code == 0 and "status" in result.stdout.lower():
-            print("MCP 服务器运行正常")
-            return
-        if i < 4:
-            print(f"   等待中... ({i+1}/5)")
-            time.sleep(2)
+    # 重试循环在 sandbox 内执行，只需一次 RPC（最多 5 次，间隔 2 秒）
+    result = sandbox.commands.run(_VERIFY_SCRIPT, timeout=60)
+    if "READY" in result.stdout.split():
+        print("MCP 服务器运行正常")
+        return
     
     print("\n服务器未响应")
-    proc = sandbox.commands.run("ps aux | grep -v grep | grep order_wise_mcp_server || true", timeout=10)
-    port = sandbox.commands.run("netstat -tlnp 2>/dev/null | grep 8703 || ss -tlnp 2>/dev/null | grep 8703 || true", timeout=10)
-    print(f"   进程: {'运行中' if proc.stdout.strip() else '未找到'}")
-    print(f"   端口: {'监听中' if '8703' in port.stdout else '未监听'}")
+    diag = run_sections(sandbox, {"proc": PROC_CHECK_CMD, "port": PORT_CHECK_CMD})
+    print(f"   进程: {'运行中' if diag['proc'].strip() else '未找到'}")
+    # PORT_CHECK_CMD 在服务端按端口 grep，有输出即表示监听中
+    print(f"   端口: {'监听中' if diag['port'].strip() else '未监听'}")
+
+
+def _resolve_model_config(api_base: Optional[str], api_key: Optional[str],
+                          model_name: Optional[str]) -> tuple[Optional[str], Optional[str], Optional[str]]:
+    """命令行参数优先，缺省时一次性从环境变量补齐 (api_base, api_key, model_name)"""
+    env = os.environ
+    return (
+        api_base or env.get("PHONE_AGENT_BASE_URL"),
+        api_key or env.get("PHONE_AGENT_API_KEY") or env.get("ZHIPU_API_KEY"),
+        model_name or env.get("PHONE_AGENT_MODEL"),
+    )
+
+
+@lru_cache(maxsize=None)
+def _infer_model_provider(api_base: str) -> str:
+    """根据 API 地址推断模型提供商（按地址缓存）"""
+    if "bigmodel.cn" in api_base or "zhipu" in api_base.lower():
+        return "zhipu"
+    if "openai.com" in api_base:
+        return "openai"
+    return "local"
 
 
 def main():
@@ -168,6 +279,8 @@ def main():
     parser.add_argument("--model-api-key", help="模型 API Key（默认: 从环境变量 PHONE_AGENT_API_KEY 读取）")
     parser.add_argument("--model-name", help="模型名称（默认: 从环境变量 PHONE_AGENT_MODEL 读取）")
     parser.add_argument("--adbkey", help="本地 ADB 密钥文件路径（本地文件系统路径，如 ~/.android/adbkey），将复制到 sandbox 的 ~/.android/adbkey")
+    parser.add_argument("--adb-parallelism", type=int, default=DEFAULT_ADB_PARALLELISM,
+                       help=f"并发执行 adb connect 的设备数（默认: {DEFAULT_ADB_PARALLELISM}，连接超时时可设为 1 逐个连接）")
     parser.add_argument("--skip-devices", action="store_true", help="跳过设备连接")
     parser.add_argument("--skip-model", action="store_true", help="跳过模型配置")
     parser.add_argument("--skip-start", action="store_true", help="跳过启动 MCP 服务器")
@@ -176,16 +289,14 @@ def main():
     args = parser.parse_args()
     
     if not args.skip_model:
-        api_base = args.model_api_base or os.getenv("PHONE_AGENT_BASE_URL")
-        api_key = args.model_api_key or os.getenv("PHONE_AGENT_API_KEY") or os.getenv("ZHIPU_API_KEY")
-        model_name = args.model_name or os.getenv("PHONE_AGENT_MODEL")
+        api_base, api_key, model_name = _resolve_model_config(args.model_api_base, args.model_api_key, args.model_name)
         
         if not all([api_base, api_key, model_name]):
             print("错误: 请设置模型配置（命令行参数或环境变量）")
             sys.exit(1)
         
         if not args.model_provider:
-            args.model_provider = "zhipu" if "bigmodel.cn" in api_base or "zhipu" in api_base.lower() else "openai" if "openai.com" in api_base else "local"
+            args.model_provider = _infer_model_provider(api_base)
         
         args.model_api_base, args.model_api_key, args.model_name = api_base, api_key, model_name
     
@@ -198,18 +309,36 @@ def main():
     sandbox = Sandbox.connect(sandbox_id=args.sandbox_id)
     print("连接成功")
     
-    if hasattr(sandbox, 'get_host'):
-        print(f"   MCP 服务: http://{sandbox.get_host(8703)}")
-    
-    if not args.skip_devices:
-        if args.devices:
-            connect_devices(sandbox, args.devices, adbkey_path=args.adbkey)
-            configure_device_mapping(sandbox, args.devices)
-        else:
-            print("未提供设备 IP，跳过设备配置（使用 --devices 指定）")
+    # get_host 结果只取一次，开头和结尾的提示复用
+    host_url = f"http://{sandbox.get_host(8703)}" if hasattr(sandbox, 'get_host') else None
+    if host_url:
+        print(f"   MCP 服务: {host_url}")
     
-    if not args.skip_model:
-        configure_model_service(sandbox, args.model_provider, args.model_api_base, args.model_api_key, args.model_name)
+    # 设备连接、设备映射写入、模型配置写入互不依赖，并发执行；全部完成后再启动服务
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = []
+        if not args.skip_devices:
+            # 设备连接和设备映射使用同一份去重、校验后的地址列表
+            device_ips = normalize_device_addrs(args.devices) if args.devices else []
+            if device_ips:
+                futures.append(executor.submit(
+                    connect_devices, sandbox, device_ips,
+                    adbkey_path=args.adbkey, parallelism=args.adb_parallelism,
+                ))
+                futures.append(executor.submit(configure_device_mapping, sandbox, device_ips))
+            elif args.devices:
+                print("没有有效的设备地址，跳过设备配置")
+            else:
+                print("未提供设备 IP，跳过设备配置（使用 --devices 指定）")
+        
+        if not args.skip_model:
+            futures.append(executor.submit(
+                configure_model_service, sandbox, args.model_provider,
+                args.model_api_base, args.model_api_key, args.model_name,
+            ))
+        
+        for future in futures:
+            future.result()
     
     if not args.skip_start:
         start_mcp_server(sandbox, background=not args.foreground)
@@ -218,8 +347,8 @@ def main():
     print("\n" + "=" * 60)
     print("配置完成!")
     print("=" * 60)
-    if hasattr(sandbox, 'get_host'):
-        print(f"\nMCP 服务地址: http://{sandbox.get_host(8703)}")
+    if host_url:
+        print(f"\nMCP 服务地址: {host_url}")
     print("查看日志: python view_logs.py", args.sandbox_id)
 
 
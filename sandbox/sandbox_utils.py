@@ -0,0 +1,23 @@
+"""
+configure_sandbox.py 与 view_logs.py 共用的 sandbox 命令辅助函数
+"""
+
+from ucloud_sandbox import Sandbox
+
+
+SECTION_MARKER = "===SECTION==="
+
+# MCP 服务器进程 / 8703 端口检查命令（无结果时输出为空，始终以 0 退出）
+PROC_CHECK_CMD = "ps aux | grep -v grep | grep order_wise_mcp_server || true"
+PORT_CHECK_CMD = "netstat -tlnp 2>/dev/null | grep 8703 || ss -tlnp 2>/dev/null | grep 8703 || true"
+
+
+def run_sections(sandbox: Sandbox, sections: dict[str, str], timeout: float = 30) -> dict[str, str]:
+    """将多条诊断命令合并为一次 sandbox 命令执行，按 section 名拆分输出"""
+    script = "; ".join(f"echo '{SECTION_MARKER}{name}'; {{ {cmd}; }}" for name, cmd in sections.items())
+    result = sandbox.commands.run(script, timeout=timeout)
+    outputs = dict.fromkeys(sections, "")
+    for chunk in result.stdout.split(SECTION_MARKER)[1:]:
+        name, _, output = chunk.partition("\n")
+        outputs[name] = output
+    return outputs
@@ -13,11 +13,59 @@
 """
 
 import argparse
+import inspect
 import os
 import sys
 import time
 from ucloud_sandbox import Sandbox
 
+from sandbox_utils import PORT_CHECK_CMD, PROC_CHECK_CMD, run_sections
+
+
+_SIZE_MARKER = "===SIZE==="
+# 输出 /tmp/mcp_server.log 自偏移 {last} 起到当前大小为止的新增内容，末尾附 ===SIZE===<当前大小>
+_TAIL_DELTA_SCRIPT = (
+    "LAST={last}; sz=$(stat -c%s /tmp/mcp_server.log 2>/dev/null || echo 0); "
+    "if [ \"$sz\" -gt \"$LAST\" ]; then tail -c +$((LAST+1)) /tmp/mcp_server.log | head -c $((sz-LAST)); fi; "
+    "echo \"" + _SIZE_MARKER + "$sz\""
+)
+
+
+_PROJECT_LOG_GLOB = "/workspace/orderwise-agent/logs/*.log"
+_LATEST_LOG_CMD = f"ls -t {_PROJECT_LOG_GLOB} 2>/dev/null | head -1"
+# 在服务端找到最新日志文件并输出最后 {lines} 行（SDK 对非零退出码抛异常，因此始终以 0 退出）
+_LATEST_LOG_TAIL_SCRIPT = (
+    "latest=$(" + _LATEST_LOG_CMD + "); "
+    "if [ -n \"$latest\" ]; then tail -{lines} \"$latest\" 2>/dev/null; fi; true"
+)
+# 跟踪模式下重新查找最新日志文件的间隔（秒）
+_LATEST_LOG_REFRESH_INTERVAL = 10
+
+
+def _supports_background_stream(sandbox: Sandbox) -> bool:
+    """SDK 的 commands.run 是否支持后台运行（返回可 wait/kill 的命令句柄）"""
+    try:
+        return "background" in inspect.signature(sandbox.commands.run).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _stream_command(sandbox: Sandbox, cmd: str) -> bool:
+    """在 sandbox 中后台运行长命令并实时打印输出，SDK 不支持时返回 False"""
+    # 预先检查是否支持，流式输出过程中的异常照常抛出，避免回退后重复输出整个日志
+    if not _supports_background_stream(sandbox):
+        return False
+    handle = sandbox.commands.run(cmd, background=True, timeout=0)
+    try:
+        handle.wait(on_stdout=lambda chunk: print(chunk, end='', flush=True))
+    finally:
+        # 客户端断开不会结束远端命令：Ctrl+C 或出错时显式 kill，避免遗留 tail -F 进程
+        try:
+            handle.kill()
+        except Exception as e:
+            print(f"\n结束远端命令失败: {e}")
+    return True
+
 
 def view_startup_log(sandbox: Sandbox, tail: bool = False):
     """查看启动日志（/tmp/mcp_server.log）"""
@@ -28,15 +76,19 @@ def view_startup_log(sandbox: Sandbox, tail: bool = False):
     if tail:
         print("实时跟踪日志（按 Ctrl+C 退出）...\n")
         try:
+            # 优先在服务端后台运行 tail -F 并流式输出，SDK 不支持后台命令时退回轮询
+            if _stream_command(sandbox, "tail -n +1 -F /tmp/mcp_server.log 2>/dev/null"):
+                return
+            # 每次轮询只执行一条命令：服务端计算新增内容并在末尾附上当前文件大小
             last_size = 0
             while True:
-                result = sandbox.commands.run("wc -c /tmp/mcp_server.log 2>/dev/null | awk '{print $1}' || echo '0'", timeout=10)
-                current_size = int(result.stdout.strip() or '0')
+                result = sandbox.commands.run(_TAIL_DELTA_SCRIPT.format(last=last_size), timeout=10)
+                output, _, size = result.stdout.rpartition(_SIZE_MARKER)
+                current_size = int(size.strip() or '0')
                 
                 if current_size > last_size:
-                    result = sandbox.commands.run(f"tail -c +{last_size+1} /tmp/mcp_server.log 2>/dev/null || echo ''", timeout=10)
-                    if result.stdout.strip():
-                        print(result.stdout, end='', flush=True)
+                    if output.strip():
+                        print(output, end='', flush=True)
                     last_size = current_size
                 
                 time.sleep(1)
@@ -53,69 +105,85 @@ def view_project_logs(sandbox: Sandbox, tail: bool = False):
     print("项目日志 (/workspace/orderwise-agent/logs/)")
     print("=" * 60)
     
-    # 列出日志文件
-    result = sandbox.commands.run("ls -lht /workspace/orderwise-agent/logs/*.log 2>/dev/null | head -10 || echo '无日志文件'", timeout=10)
-    if "无日志文件" not in result.stdout:
-        print("日志文件列表:")
-        print(result.stdout)
-        
-        if tail:
-            print("\n实时跟踪最新日志文件（按 Ctrl+C 退出）...\n")
-            try:
-                while True:
-                    latest = sandbox.commands.run("ls -t /workspace/orderwise-agent/logs/*.log 2>/dev/null | head -1", timeout=10)
-                    if latest.stdout.strip():
-                        result = sandbox.commands.run(f"tail -20 {latest.stdout.strip()} 2>/dev/null || echo ''", timeout=10)
-                        if result.stdout.strip():
-                            print(result.stdout, end='', flush=True)
-                    time.sleep(2)
-            except KeyboardInterrupt:
-                print("\n\n停止跟踪")
-        else:
-            # 查看最新日志文件的内容
-            latest = sandbox.commands.run("ls -t /workspace/orderwise-agent/logs/*.log 2>/dev/null | head -1", timeout=10)
-            if latest.stdout.strip():
-                log_file = latest.stdout.strip()
-                print(f"\n最新日志文件: {log_file}")
-                result = sandbox.commands.run(f"tail -50 {log_file} 2>/dev/null || echo '无内容'", timeout=10)
-                print(result.stdout)
-    else:
+    # 文件列表、最新文件路径及其内容合并为一次 sandbox 命令
+    logs = run_sections(sandbox, {
+        "list": f"ls -lht {_PROJECT_LOG_GLOB} 2>/dev/null | head -10",
+        "latest": _LATEST_LOG_CMD,
+        "content": _LATEST_LOG_TAIL_SCRIPT.format(lines=20 if tail else 50),
+    }, timeout=10)
+    if not logs["list"].strip():
         print("无日志文件")
+        return
+    
+    print("日志文件列表:")
+    print(logs["list"])
+    latest_log = logs["latest"].strip()
+    
+    if tail:
+        print("\n实时跟踪最新日志文件（按 Ctrl+C 退出）...\n")
+        try:
+            output = logs["content"]
+            next_refresh = time.monotonic() + _LATEST_LOG_REFRESH_INTERVAL
+            while True:
+                if output.strip():
+                    print(output, end='', flush=True)
+                time.sleep(2)
+                # 新日志文件很少出现：缓存最新文件路径，每隔一段时间才重新查找
+                if not latest_log or time.monotonic() >= next_refresh:
+                    logs = run_sections(sandbox, {
+                        "latest": _LATEST_LOG_CMD,
+                        "content": _LATEST_LOG_TAIL_SCRIPT.format(lines=20),
+                    }, timeout=10)
+                    latest_log = logs["latest"].strip()
+                    output = logs["content"]
+                    next_refresh = time.monotonic() + _LATEST_LOG_REFRESH_INTERVAL
+                else:
+                    output = sandbox.commands.run(f'tail -20 "{latest_log}" 2>/dev/null || true', timeout=10).stdout
+        except KeyboardInterrupt:
+            print("\n\n停止跟踪")
+    elif latest_log:
+        print(f"\n最新日志文件: {latest_log}")
+        print(logs["content"] or "无内容")
 
 
 def check_status(sandbox: Sandbox):
     """检查服务器状态"""
+    # 四项检查合并为一次 sandbox 命令
+    status = run_sections(sandbox, {
+        "proc": PROC_CHECK_CMD,
+        "port": PORT_CHECK_CMD,
+        "http": "curl -s -m 10 -w '\nHTTP状态码: %{http_code}\n' http://localhost:8703/ 2>&1 || echo '连接失败'",
+        "env": "(cd /workspace/orderwise-agent && source env.sh && env | grep PHONE_AGENT) || true",
+    })
+    
     print("=" * 60)
     print("1. 检查进程")
     print("=" * 60)
-    result = sandbox.commands.run("ps aux | grep -v grep | grep order_wise_mcp_server || true", timeout=10)
-    if result.stdout.strip():
+    if status["proc"].strip():
         print("进程运行中:")
-        print(result.stdout)
+        print(status["proc"])
     else:
         print("进程未找到")
     
     print("\n" + "=" * 60)
     print("2. 检查端口")
     print("=" * 60)
-    result = sandbox.commands.run("netstat -tlnp 2>/dev/null | grep 8703 || ss -tlnp 2>/dev/null | grep 8703 || echo '未监听'", timeout=10)
-    if "8703" in result.stdout:
+    # 服务端 grep 已按端口过滤，有输出即表示监听中
+    if status["port"].strip():
         print("端口监听中:")
-        print(result.stdout)
+        print(status["port"])
     else:
         print("端口 8703 未监听")
     
     print("\n" + "=" * 60)
     print("3. 测试 HTTP 连接")
     print("=" * 60)
-    result = sandbox.commands.run("curl -s -w '\nHTTP状态码: %{http_code}\n' http://localhost:8703/ 2>&1 || echo '连接失败'", timeout=10)
-    print(result.stdout)
+    print(status["http"])
     
     print("\n" + "=" * 60)
     print("4. 检查环境变量")
     print("=" * 60)
-    result = sandbox.commands.run("cd /workspace/orderwise-agent && source env.sh && env | grep PHONE_AGENT", timeout=10)
-    print(result.stdout)
+    print(status["env"])
 
 
 def main():